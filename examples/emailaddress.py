@@ -40,13 +40,13 @@ from string import ascii_letters, digits
 from picoparse import one_of, many, many1, not_one_of, run_parser, tri, commit, optional, fail
 from picoparse import choice, string, peek, string, eof, many_until, any_token, satisfies
 from picoparse import sep, sep1, compose, cue, seq
-from picoparse.text import run_text_parser
+from picoparse.text import validate_text, char_class
 from picoparse import partial
 
 
 # generic parsers
 def char_range(lower, upper):
-    satisfies(lambda c: lower <= ord(c) <= upper)
+    return char_class([(lower, upper)])
 
 # character parsers
 comma = partial(one_of, ",")
@@ -65,7 +65,7 @@ backslash = partial(one_of, "\\")
 
 # common rfc grammers
 DQUOTE = partial(one_of, '"') # Double quote
-VCHAR = partial(char_range, int('21', 16), int('7E', 16)) # visible (printing) characters
+VCHAR = char_range(int('21', 16), int('7E', 16)) # visible (printing) characters
 WSP = partial(one_of, " \t") # whitespace
 CR = partial(one_of, chr(int('0D', 16))) # carriage return
 LF = partial(one_of, chr(int('0A', 16))) # line feed
@@ -95,9 +95,9 @@ FWS = None
 #                     %d35-91 /          ;  characters not including
 #                     %d93-126 /         ;  "\" or the quote character
 #                     obs-qtext
-qtext = partial(choice, partial(one_of, chr(33)), 
-                        partial(char_range, 35, 91), 
-                        partial(char_range, 93, 126),
+qtext = partial(choice, char_range(33, 33)
+                      | char_range(35, 91)
+                      | char_range(93, 126),
                         obs_qtext)
 
 # quoted-pair     =   ("\" (VCHAR / WSP)) / obs-qp
@@ -128,9 +128,9 @@ FWS = partial(choice, partial(seq, partial(optional, partial(seq, partial(many,
 #                     %d42-91 /          ;  characters not including
 #                     %d93-126 /         ;  "(", ")", or "\"
 #                     obs-ctext
-ctext = partial(choice, partial(char_range, 33, 39)
-                      , partial(char_range, 42, 91)
-                      , partial(char_range, 93, 126)
+ctext = partial(choice, char_range(33, 39)
+                      | char_range(42, 91)
+                      | char_range(93, 126)
                       , obs_ctext)
 
 
@@ -203,7 +203,7 @@ phrase = partial(choice, tri(partial(many1, word)), obs_phrase)
 # dtext           =   %d33-90 /          ; Printable US-ASCII
 #                     %d94-126 /         ;  characters not including
 #                     obs-dtext          ;  "[", "]", or "\"
-dtext = partial(choice, partial(char_range, 33, 99), partial(char_range, 94, 126), obs_dtext)
+dtext = partial(choice, char_range(33, 99) | char_range(94, 126), obs_dtext)
 
 # domain-literal  =   [CFWS] "[" *([FWS] dtext) [FWS] "]" [CFWS]
 def domain_literal():
@@ -275,11 +275,12 @@ address = partial(choice, mailbox, group)
  
 def validate_address(text):
     try: 
-        run_text_parser(partial(seq, address, partial(one_of, '\n')), text)
+        validate_text(partial(cue, address, partial(one_of, '\n')), text)
         return True
     except Exception, e:
         print e
         return False
     
-import sys
-print "address is valid" if validate_address(sys.argv[1]) else "address is not valid"
+if __name__ == "__main__":
+    import sys
+    print "address is valid" if validate_address(sys.argv[1]) else "address is not valid"
@@ -29,21 +29,29 @@ A parser for a simple programming language.
 
 import sys
 from picoparse import choice, p, one_of, many, many1, tri, eof, not_followed_by, satisfies, string, commit, optional, sep1, desc, not_one_of
+from picoparse import keyword_set, recover, many_until, keep_values
 from picoparse.text import run_text_parser, whitespace
 
 reserved_words = ["let", "in", "fn", "def", "where"]
 reserved_operators = ["=", "->"]
 operator_chars = "+-*/!<>=@$%^&~|?"
 
+# these match any reserved word (or operator) in one pass, for the lookahead that 
+# stops identifiers and operators from being reserved ones
+any_reserved = keyword_set(reserved_words, boundary=lambda l: l.isalnum() or l == "_")
+any_reserved_op = keyword_set(reserved_operators, boundary=operator_chars)
+
 def identifier_char1():
   return satisfies(lambda l: l.isalpha() or l == "_")
 
-def identifier_char():
-  return choice(identifier_char1, digit)
-
 def digit():
   return satisfies(lambda l: l.isdigit())
 
+def identifier_char():
+  return choice(identifier_char1, digit)
+
+# number converts the digits it reads, so it needs them even when run by validate
+@keep_values
 @tri
 def number():
   whitespace()
@@ -84,7 +92,7 @@ def reserved(name):
 @tri
 def identifier():
   whitespace()
-  not_followed_by(p(choice, *[p(reserved, rw) for rw in reserved_words]))
+  not_followed_by(any_reserved)
   first = identifier_char1()
   commit()
   rest = many(identifier_char)
@@ -97,7 +105,7 @@ def operator_char():
 @tri
 def operator():
   whitespace()
-  not_followed_by(p(choice, *[p(reserved_op, op) for op in reserved_operators]))
+  not_followed_by(any_reserved_op)
   name = u''.join(many1(operator_char))
   return ('op', name)
 
@@ -178,10 +186,14 @@ def program_part():
   optional(semi)
   return expr
 
-def program():
-  prog = many(program_part)
+@tri
+def end_of_program():
   whitespace()
   eof()
+
+def program():
+  # when run with an errors list, a broken part is recorded and skipped up to its ';' 
+  prog, end = many_until(p(recover, program_part, semi, ('error',)), end_of_program)
   return ('prog', prog)
 
 if __name__ == "__main__":
@@ -196,5 +208,8 @@ if __name__ == "__main__":
     """
     if len(sys.argv) > 1:
         text = sys.argv[1]
-    print run_text_parser(program, text)
+    errors = []
+    print run_text_parser(program, text, errors=errors)
+    for error in errors:
+        print error
 
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# Copyright (c) 2009, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+
+"""
+The language from lambda.py, parsed in two stages: a table driven lexer splits the 
+text into tokens, and the parser works on the tokens rather than on characters.
+"""
+
+import sys
+from string import ascii_letters, digits, whitespace
+from picoparse import choice, p, many, many1, tri, eof, optional, sep1, cue
+from picoparse.lexer import Lexer, literal, run, quoted, keywords, skip, token, run_lexer_parser
+
+reserved_words = ["let", "in", "fn", "def", "where"]
+operator_chars = "+-*/!<>=@$%^&~|?"
+
+# Rules are listed in priority order; the longest match wins, and the earlier rule 
+# wins a tie, so '=' and '->' are their own tokens but '==' is an operator.
+lexer = Lexer([
+  skip(run('space', whitespace)),
+  run('ident', ascii_letters + '_', ascii_letters + digits + '_'),
+  keywords(reserved_words, 'ident'),
+  run('number', digits),
+  quoted('string', '\'"', '\\'),
+  literal('='),
+  literal('->'),
+  run('op', operator_chars),
+  literal('('),
+  literal(')'),
+  literal(','),
+  literal(';'),
+  literal('.'),
+])
+
+def token_text(kind, name=None):
+  return token(kind, name)[1]
+
+def number():
+  lead = token_text('number')
+  trail = optional(tri(p(cue, p(token, '.'), p(token_text, 'number'))))
+  if trail:
+    return ('float', float(lead + '.' + trail))
+  else:
+    return ('int', int(lead))
+
+def string_literal():
+  st = token_text('string')[1:-1]
+  return ('str', st.decode('string_escape'))
+
+def value():
+  return choice(number, string_literal)
+
+def reserved(name):
+  return token_text('keyword', name)
+
+def identifier():
+  return ('ident', token_text('ident'))
+
+def operator():
+  return ('op', token_text('op'))
+
+def expression():
+  expr = choice(eval_expression, let_expression, fn_expression)
+  where = optional(where_expression, None)
+  if where:
+    return ('where', expr, where)
+  else:
+    return expr
+
+def eval_expression():
+  parts = many1(expression_part)
+  if len(parts) == 1:
+    return parts[0]
+  else:
+    return ('eval', parts)
+
+def expression_part():
+  return choice(value, identifier, operator, parenthetical)
+
+def let_binding():
+  name = identifier()
+  token('=')
+  expr = expression()
+  return ('bind', name, expr)
+
+def let_expression():
+  reserved('let')
+  bindings = sep1(let_binding, p(token, ','))
+  reserved('in')
+  expr = expression()
+  return ('let', bindings, expr)
+
+def where_expression():
+  reserved('where')
+  return sep1(let_binding, p(token, ','))
+
+def fn_expression():
+  reserved('fn')
+  params = many1(identifier)
+  token('->')
+  expr = expression()
+  return ('fn', params, expr)
+
+def parenthetical():
+  token('(')
+  expr = expression()
+  token(')')
+  return expr
+
+def definition():
+  reserved('def')
+  name = identifier()
+  token('=')
+  expr = expression()
+  return ('def', name, expr)
+
+def program_part():
+  expr = choice(definition, expression)
+  optional(p(token, ';'))
+  return expr
+
+def program():
+  prog = many(program_part)
+  eof()
+  return ('prog', prog)
+
+if __name__ == "__main__":
+    text = """
+    def fib = fn n ->
+        if (n == 0)
+            then 0
+            else (fib n1 + fib n2)
+                where n1 = n - 1, n2 = n1 - 1
+    let x = 5, y = 4
+    in fib (x * y)
+    """
+    if len(sys.argv) > 1:
+        text = sys.argv[1]
+    print run_lexer_parser(program, lexer, text)
@@ -28,6 +28,7 @@ parser and specailise it with 'p'"""
 from picoparse import partial
 from picoparse import one_of, optional, many, choice, p, cue
 from picoparse.text import run_text_parser, whitespace
+from picoparse.analysis import firsts, predict
 import sys
 
 def matched(start, stop, name):
@@ -36,11 +37,13 @@ def matched(start, stop, name):
     one_of(stop)
     return [name, v]
 
-bracketed = p(matched, '[', ']', 'bracket')
-braced = p(matched, '{', '}', 'brace')
-parened = p(matched, '(', ')', 'paren')
+# matched is a plain function, so the analysis can't see that each of these starts 
+# with its opening character; firsts declares it so predict can dispatch on it.
+bracketed = firsts('[')(p(matched, '[', ']', 'bracket'))
+braced = firsts('{')(p(matched, '{', '}', 'brace'))
+parened = firsts('(')(p(matched, '(', ')', 'paren'))
 
-part = p(choice, bracketed, braced, parened)
+part = predict(bracketed, braced, parened)
 expression = p('expression', many, part)
 
 if __name__ == "__main__":
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""A paren-expression parser for deeply nested input."""
+# Copyright (c) 2009, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+
+# Times satisfies against satisfies_cached on identifier heavy input, with the cheap 
+# predicates from lambda.py and with slower ones that look characters up in unicodedata. 
+# eg:
+#   python satisfies_benchmark.py 20000
+#
+# Caching only pays for the slow predicates; with the cheap ones the two take about the 
+# same time, since a str method call costs about as much as the table lookup.
+
+from picoparse import partial as p
+from picoparse import satisfies, satisfies_cached, one_of, many, sep, cue
+from picoparse.text import run_text_parser
+import sys, time, unicodedata
+
+def is_identifier_char1(l):
+    return l.isalpha() or l == "_"
+
+def is_identifier_char(l):
+    return l.isalnum() or l == "_"
+
+def is_letter(l):
+    return unicodedata.category(unicode(l)).startswith('L') or l == "_"
+
+def is_letter_or_digit(l):
+    return unicodedata.category(unicode(l))[0] in 'LN' or l == "_"
+
+def identifiers(char1, char):
+    identifier = p(cue, char1, p(many, char))
+    return p(sep, identifier, p(one_of, ' '))
+
+def compared(char1, char):
+    return [('satisfies', identifiers(p(satisfies, char1), p(satisfies, char))), 
+            ('satisfies_cached', identifiers(satisfies_cached(char1), satisfies_cached(char)))]
+
+def text(n):
+    return ' '.join('%s_%d%s' % (('alpha', 'beta', 'gamma_delta')[i % 3], i, 'x' * (i % 7))
+                    for i in range(n))
+
+def timed(parser, text):
+    start = time.time()
+    result, rest = run_text_parser(parser, text)
+    return time.time() - start, len(result)
+
+if __name__ == "__main__":
+    n = 10000
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    t = text(n)
+    for guards, char1, char in [('str methods', is_identifier_char1, is_identifier_char), 
+                                ('unicodedata', is_letter, is_letter_or_digit)]:
+        for name, parser in compared(char1, char):
+            seconds, count = timed(parser, t)
+            print "%-12s %-16s %d identifiers, %d characters: %.3fs" % (
+                guards, name, count, len(t), seconds)
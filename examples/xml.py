@@ -32,10 +32,11 @@ Comments throughout the file explain what is going on
 # to learning and groking small pieces at a time
 from picoparse import one_of, many, many1, not_one_of, run_parser, tri, commit, optional, fail
 from picoparse import choice, string, peek, string, eof, many_until, any_token, satisfies
-from picoparse import sep, sep1, compose, cue
+from picoparse import sep, sep1, compose, cue, keep_values
 from picoparse.text import build_string, caseless_string, quoted, quote, whitespace, whitespace1
-from picoparse.text import lexeme, run_text_parser
+from picoparse.text import lexeme, run_text_parser, char_class
 from picoparse import partial
+from picoparse.cache import artifact
 
 # We define common primative parsers by partial application. This is similar to the lexical 
 # analysis stage of a more traditional parser tool.
@@ -53,12 +54,19 @@ hex_decimal_digit = partial(one_of, '0123456789AaBbCcDdEeFf')
 
 # hex_value is a simple parser that knows how to parse out a set of hex digits and return them
 # as an integer. build_string wraps up u''.join(iterable) for us. 
+#
+# keep_values matters when the grammar is run with validate, which only checks that the input 
+# matches: many and the other combinators then return empty lists rather than building 
+# results nobody will look at. Parsers like this one, that look at the results, are wrapped 
+# in keep_values so they still get them.
+@keep_values
 def hex_value():
     return int(build_string(many(hex_decimal_digit)), 16)
 
 # The next primatives we need are for the XML name type. The specification for this is reasonably 
 # involved; instead of manually implementing it, we are going to create a new parser for the
-# grammer that the spec ifself uses. This parser will generate a new parser for us.
+# grammer that the spec ifself uses. This parser will read the ranges of characters out of 
+# the spec for us, and we will build parsers from those ranges.
 #
 # To be clear, this piece of code creates a parser that runs when the module is loaded, not when
 # parsing the XML itself.
@@ -70,12 +78,16 @@ def hex_value():
 # it takes two parsers, runs the first, and then if that accepts, it runs the second and returns 
 # the result. You can see that we are defining a specialisation of cue with a specialisation of 
 # string (which only accepts if the input matches the iterable it is given), and hex_value above.
-char_spec_hex = partial(cue, partial(string, '#x'), hex_value)
+# compose(f, g) is equivalent to f(g()); here it turns the codepoint into a character.
+char_spec_hex = compose(unichr, partial(cue, partial(string, '#x'), hex_value))
+
+# A single character is just a range from that character to itself. The next two parsers use 
+# compose again to turn the character they find into a (low, high) range.
+def single_range(c):
+    return (c, c)
 
-# The next two parsers use a function 'compose' as well as nested partials. This is creating
-# a parser that returns a parser. compose(f, g) is equivalent to f(g()). 
-char_spec_single_char = compose(partial(partial, one_of), quoted)
-char_spec_single_hex_char = compose(partial(partial, one_of), char_spec_hex)
+char_spec_single_char = compose(single_range, quoted)
+char_spec_single_hex_char = compose(single_range, char_spec_hex)
 
 # Now that we have parsers for the different notations for characters, we need to create a parser
 # that can choose the correct parser to use. For this we are going to specialise 'choice', This 
@@ -86,16 +98,13 @@ char_spec_range_char = partial(choice, char_spec_hex, any_token)
 # The second part of the character spec is a range. This is more complex that previous parsers
 # and we are using a def for it. This parser takes advantage of the previous definition of 
 # the char_spec_range_char to find either literal characters or hexdecimal codepoints.
-# It returns a new parser specialising 'satisfies'. satisfies takes a function that is called 
-# against the input. In this case we are creating a parser that checks that a character is within
-# the given range
 def char_spec_range():
     one_of("[")
     low = char_spec_range_char()
     one_of('-')
     high = char_spec_range_char()
     one_of("]")
-    return partial(satisfies, lambda c: low <= c <= high)
+    return (low, high)
 
 char_spec_seperator = partial(lexeme, partial(one_of, '|'))
 
@@ -105,7 +114,7 @@ char_spec_seperator = partial(lexeme, partial(one_of, '|'))
 #
 # Secondly, note the 'eof()' here. This parser is checking that we have reached the end of the input
 #
-# The last thing to be aware of is that each of the choices _returns a list of parsers_
+# The last thing to be aware of is that each of the choices _returns a (low, high) range_
 def xml_char_spec_parser():
     v = sep1(partial(choice, char_spec_range, char_spec_single_char, char_spec_single_hex_char),
              char_spec_seperator)
@@ -113,22 +122,36 @@ def xml_char_spec_parser():
     return v
 
 # We cant call parsers from outside of a 'run_parser' call. run_parser evaluates the parser function
-# you provide over the input you provide, returning the result, and the remainder. Remember that 
-# xml_char_spec_parser returns a list of parsers. This function wraps those parses up in a choice.
-# This choice parser will accept a single character if it falls within the spec. 
-def xml_char_spec(spec, extra_choices=[]):
-    parsers, remainder = run_parser(xml_char_spec_parser, spec.strip())
-    return partial(choice, *(extra_choices + parsers))
+# you provide over the input you provide, returning the result, and the remainder. 
+#
+# Reading the spec is work done every time this module is imported, so char_spec_ranges is 
+# decorated with 'artifact'. The list of ranges it returns is saved to disk the first time, and 
+# later imports load it rather than running the parser again. This only works because the result 
+# is plain data; parser functions can't be saved like this.
+@artifact
+def char_spec_ranges(spec):
+    ranges, remainder = run_parser(xml_char_spec_parser, spec.strip())
+    return ranges
+
+# char_class merges the ranges into a single sorted table, and makes a parser that accepts a 
+# character in any of them. This is much quicker than trying a parser for each range in turn 
+# with choice. (picoparse.text.char_spec does all of the above in one step, but then we 
+# wouldn't have had the chance to write a parser for the notation ourselves.)
+def xml_char_spec(spec):
+    return char_class(char_spec_ranges(spec))
 
 # Finally, we run the xml_char_spec function over the character sets to get two new parsers
-# to accept the valid characters for names of elements and attributes. 
+# to accept the valid characters for names of elements and attributes. Character classes can 
+# be combined with | to accept characters from either.
 name_start_char = xml_char_spec('":" | [A-Z] | "_" | [a-z] | [#xC0-#xD6] | [#xD8-#xF6] | [#xF8-#x2FF] | [#x370-#x37D] | [#x37F-#x1FFF] | [#x200C-#x200D] | [#x2070-#x218F] | [#x2C00-#x2FEF] | [#x3001-#xD7FF] | [#xF900-#xFDCF] | [#xFDF0-#xFFFD] | [#x10000-#xEFFFF]')
-name_char = xml_char_spec('"-" | "." | [0-9] | #xB7 | [#x0300-#x036F] | [#x203F-#x2040]', [name_start_char])
+name_char = name_start_char | xml_char_spec('"-" | "." | [0-9] | #xB7 | [#x0300-#x036F] | [#x203F-#x2040]')
 
 # We return to the parser for XML now, rather than the grammer for xml characers.
 
 # Now that we have those two primatives, we can build a parser that accepts an xml name.
-# You can see that a name has one name_start_char, followed by zero or more name_chars
+# You can see that a name has one name_start_char, followed by zero or more name_chars. 
+# end_element compares names, so they are built even under validate.
+@keep_values
 def xml_name():
     return build_string([name_start_char()] + many(name_char))
 
@@ -150,6 +173,7 @@ def entity():
     one_of(';')
     return ent
 
+@keep_values
 def named_entity():
     name = build_string(many1(partial(not_one_of,';#')))
     if name not in named_entities: fail()
@@ -159,6 +183,7 @@ def hex_entity():
     one_of('x')
     return unichr(hex_value())
 
+@keep_values
 def dec_entity():
     return unichr(int(build_string(many1(decimal_digit)), 10))
 
@@ -279,7 +304,8 @@ def attribute():
 
 parse_xml = partial(run_text_parser, xml)
 
-tokens, remaining = parse_xml("""
+if __name__ == "__main__":
+    tokens, remaining = parse_xml("""
 <?xml version="1.0" ?>
 <!DOCTYPE MyDoctype>
 
@@ -294,7 +320,7 @@ tokens, remaining = parse_xml("""
 </root>
 """)
 
-print "nodes:", tokens
-print
-print "remaining:", build_string(remaining)
+    print "nodes:", tokens
+    print
+    print "remaining:", build_string(remaining)
 
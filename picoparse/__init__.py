@@ -24,40 +24,91 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
 # POSSIBILITY OF SUCH DAMAGE.
 
+__version__ = '0.9'
+
 try:
-    from functools import partial
+    from functools import partial as _partial
 except ImportError:
-    def __merged(d1,d2):
-        """Dictionary merge"""
-        d = d1.copy()
-        d.update(d2)
-        return d
-
-    def partial(*args,**kw):
+    class _partial(object):
         """Return a version of a function with some arguments already supplied.
         """
-        fn = args[0]
-        args = args[1:]
-        return lambda *args2,**kw2: fn(*(args+args2),**__merged(kw,kw2))
+        __slots__ = ('func', 'args', 'keywords', '__dict__')
+        
+        def __init__(self, func, *args, **keywords):
+            self.func = func
+            self.args = args
+            self.keywords = keywords or None
+        
+        def __call__(self, *args, **kwargs):
+            if self.keywords:
+                kw = self.keywords.copy()
+                kw.update(kwargs)
+                kwargs = kw
+            return self.func(*(self.args + args), **kwargs)
 
 from itertools import izip, count
+from collections import deque
 from operator import add
 import threading
+import sys
+import time
+
+class Expectation(object):
+    """An item in NoMatch.expecting whose description is only built when it is needed.
+    
+    describe(*args) is called when the expectations are read, and returns the list of 
+    items to report in place of this one. Most failures are caught by choice and 
+    never shown, so this saves formatting descriptions that nobody sees.
+    """
+    __slots__ = ('describe', 'args')
+    
+    def __init__(self, describe, *args):
+        self.describe = describe
+        self.args = args
+    
+    def items(self):
+        return self.describe(*self.args)
+
+def _expand(expecting):
+    items = []
+    for item in expecting:
+        if isinstance(item, Expectation):
+            items.extend(item.items())
+        else:
+            items.append(item)
+    return items
 
 class NoMatch(Exception):
-    def __init__(self, token, pos, expecting, flags=[]):
+    def __init__(self, token, pos, expecting, flags=None):
         self.token = token
         self.pos = pos
-        self.expecting = expecting
+        self._expecting = expecting
+        self._failures = None
+        if flags is None:
+            flags = []
         self.flags = flags
         self.message = None
     
     @classmethod
     def join(cls, failures):
-        token = failures[0].token
-        pos = failures[0].pos
-        expecting = sorted(set(reduce(add, [f.expecting for f in failures], [])))
-        return NoMatch(token, pos, expecting)
+        e = NoMatch(failures[0].token, failures[0].pos, None)
+        e._failures = failures
+        return e
+    
+    def _get_expecting(self):
+        if self._failures is not None:
+            failures, self._failures = self._failures, None
+            self._expecting = sorted(set(reduce(add, [f.expecting for f in failures], [])))
+        else:
+            self._expecting = _expand(self._expecting)
+        return self._expecting
+    
+    def _set_expecting(self, expecting):
+        self._expecting = expecting
+        self._failures = None
+    
+    expecting = property(_get_expecting, _set_expecting, 
+                         doc="""The list of items that would have matched""")
 
     @property
     def default_message(self):
@@ -76,25 +127,119 @@ class NoMatch(Exception):
 FailedAfterCutting = "FailedAfterCutting"
 
 
+class LookaheadExceeded(Exception):
+    """Raised when a parser holds more uncommitted input than max_lookahead allows.
+    
+    This is deliberately not a NoMatch; choice and optional will not catch it, so the 
+    whole parse is abandoned rather than backtracking into more input.
+    """
+    def __init__(self, limit, start, pos, location):
+        Exception.__init__(self, limit, start, pos, location)
+        self.limit = limit
+        self.start = start
+        self.pos = pos
+        self.location = location
+    
+    def __str__(self):
+        return "\nLookahead limit of " + str(self.limit) + " tokens exceeded at " + str(self.pos) \
+               + "\nretaining input since " + str(self.start) \
+               + "\nin " + self.location
+
+
+class BudgetExceeded(Exception):
+    """Raised when a parse uses more steps than max_steps, or runs past its deadline.
+    
+    Like LookaheadExceeded, this is not a NoMatch and abandons the whole parse.
+    """
+    def __init__(self, reason, steps, pos, location):
+        Exception.__init__(self, reason, steps, pos, location)
+        self.reason = reason
+        self.steps = steps
+        self.pos = pos
+        self.location = location
+    
+    def __str__(self):
+        return "\n" + self.reason + " after " + str(self.steps) + " steps at " + str(self.pos) \
+               + "\nin " + self.location
+
+
+class Budget(object):
+    """Counts the work a walker does, and enforces max_steps and deadline.
+    
+    Token reads (next), choice points and rewinds to them each count as a step; the 
+    loops in many, sep1 and many_until only count their reads and rewinds. The 
+    deadline, a time.time() value, is checked every check_every steps.
+    """
+    def __init__(self, walker, max_steps=None, deadline=None, check_every=1000):
+        self.walker = walker
+        self.max_steps = max_steps
+        self.deadline = deadline
+        self.check_every = check_every
+        self.reads = 0
+        self.choices = 0
+        self.rewinds = 0
+    
+    @property
+    def steps(self):
+        return self.reads + self.choices + self.rewinds
+    
+    def check(self):
+        steps = self.steps
+        if self.max_steps is not None and steps > self.max_steps:
+            self.exceeded("Step limit of " + str(self.max_steps) + " exceeded")
+        if self.deadline is not None and not steps % self.check_every \
+           and time.time() > self.deadline:
+            self.exceeded("Deadline passed")
+    
+    def exceeded(self, reason):
+        raise BudgetExceeded(reason, self.steps, self.walker.pos(), _grammar_location())
+
+
+def _grammar_location():
+    """Finds the innermost stack frame that belongs to a grammar rather than picoparse."""
+    f = sys._getframe(1)
+    while f is not None and f.f_globals.get('__name__', '').startswith('picoparse'):
+        f = f.f_back
+    if f is None:
+        return "???"
+    return f.f_code.co_name + " at " + f.f_code.co_filename + ":" + str(f.f_lineno)
+
+
 class DefaultDiagnostics(object):
-    def __init__(self):
-        self.tokens = []
-        self.offset = 1
+    """Numbers tokens from 1 and reports the tokens around a failure.
+    
+    Only the most recent tokens are kept, enough to show context tokens either side 
+    of the failure position, so storage does not grow with the uncommitted input.
+    """
+    def __init__(self, context=20):
+        self.context = context
+        self._tokens = deque(maxlen=2 * context + 1)
+    
+    @property
+    def tokens(self):
+        return list(self._tokens)
     
     def generate_error_message(self, noMatch):
         return noMatch.default_message \
-               + "\n" + repr(self.tokens)
+               + "\n" + repr(self.window(noMatch.pos))
+    
+    def window(self, pos):
+        """Returns the retained (token, position) pairs within context of pos"""
+        if pos is EndOfFile:
+            return self.tokens[-self.context:]
+        return [t for t in self._tokens if pos - self.context <= t[1] <= pos + self.context]
     
     def cut(self, col):
+        tokens = self._tokens
         if col is EndOfFile:
-            col = self.offset + len(self.tokens)
-        to_cut = col - self.offset
-        self.tokens = self.tokens[to_cut:]
-        self.offset += to_cut
+            tokens.clear()
+        else:
+            while tokens and tokens[0][1] < col:
+                tokens.popleft()
     
     def wrap(self, stream):
         for r in izip(stream, count(1)):
-            self.tokens.append(r)
+            self._tokens.append(r)
             yield r
 
 
@@ -107,6 +252,23 @@ class EOF(object):
 EndOfFile = EOF()
 
 
+class Discarded(list):
+    """An always empty list, returned in place of their results by the repetition 
+    combinators given discard=True. Results appended to it are dropped.
+    """
+    __slots__ = ()
+    
+    def append(self, value):
+        pass
+
+
+# The kind of the pending events that are failures recorded by recover
+_recovered = object()
+
+# The inputs known to slice into a copy of the same type; capture returns a list of the 
+# tokens for anything else (a deque indexes but can't slice).
+_sliceable = (basestring, list, tuple, buffer, memoryview, bytearray)
+
 class BufferWalker(object):
     """BufferWalker wraps up an iterable and provides an API for infinite lookahead
     but retains laziness. 
@@ -124,10 +286,30 @@ class BufferWalker(object):
     
     You can test the BufferWalker for Truthiness; if there is still parsable input then 
     it will be truthy, if not, falsy.
+    
+    If max_lookahead is given, the buffer may hold at most that many tokens since the 
+    last cut; reading past it raises LookaheadExceeded.
+    
+    If errors is set (see set_errors), recover records the failures it recovers from in 
+    it; otherwise recover lets them propagate.
+    
+    set_budget counts (and optionally limits) the work done by the walker; see Budget.
+    
+    set_sink gives emit somewhere to send its events.
+    
+    With recognise set (as validate does), the repetition combinators, string and 
+    capture only match their input and return empty Discarded lists; see keep_values.
+    
+    offset is the absolute index of the last cut, and base the absolute index of the 
+    start of the buffer. These differ only while pins (used by capture) hold the buffer 
+    back from a cut.
     """
-    def __init__(self, source, diag=None):
+    def __init__(self, source, diag=None, max_lookahead=None):
         if diag is None:
             diag = DefaultDiagnostics()
+        self.sequence = None
+        if isinstance(source, _sliceable):
+            self.sequence = source
         self.source = diag.wrap(iter(source))
         try:
             self.buffer = [self.source.next()]
@@ -137,20 +319,41 @@ class BufferWalker(object):
         self.len = len(self.buffer)
         self.depth = 0
         self.offset = 0
+        self.base = 0
+        self.pins = []
         self.commit_depth = 0
         self.diag = diag
+        self.max_lookahead = max_lookahead
+        self.errors = None
+        self.budget = None
+        self.sink = None
+        self.events = None
+        self.emitted = 0
+        self.recognise = False
     
     def __nonzero__(self):
         return self.peek() is not EndOfFile
     
     def _fill(self, size):
-        """fills the internal buffer from the source iterator"""
+        """fills the internal buffer from the source iterator
+        
+        Pulling from the source is where a parse can be suspended (a socket read under 
+        greenlets, a generator that runs other work), and other parses on the same thread 
+        may run in the meantime. Whichever walker was current before the pull is made 
+        current again afterwards, so interleaved parses each resume with their own state.
+        """
+        current = getattr(local_ps, 'value', None)
         try:
             for i in range(size):
                 self.buffer.append(self.source.next())
         except StopIteration:
             self.buffer.append((EndOfFile, EndOfFile))
+        finally:
+            local_ps.value = current
         self.len = len(self.buffer)
+        if self.max_lookahead is not None and self.len > self.max_lookahead:
+            raise LookaheadExceeded(self.max_lookahead, self.buffer[0][1], 
+                                    self.buffer[-1][1], _grammar_location())
     
     def next(self):
         """Advances to and returns the next token or returns EndOfFile"""
@@ -170,6 +373,15 @@ class BufferWalker(object):
         """Returns the current token or EndOfFile"""
         return self.current()[0]
     
+    def lookahead(self, n):
+        """Returns the token n places after the current one, or EndOfFile, without moving"""
+        i = self.index + n
+        if i >= self.len:
+            self._fill((i - self.len) + 1)
+        if i < self.len:
+            return self.buffer[i][0]
+        return EndOfFile
+    
     def pos(self):
         """Returns the current position or EndOfFile"""
         return self.current()[1]
@@ -178,13 +390,21 @@ class BufferWalker(object):
         raise NoMatch(self.peek(), self.pos(), expecting)
     
     def tri(self, parser, *args, **kwargs):
+        old_depth = self.enter_tri()
+        result = parser(*args, **kwargs)
+        self.leave_tri(old_depth)
+        return result
+    
+    def enter_tri(self):
+        """Opens a tri block, returning the state leave_tri needs to close it"""
         old_depth = self.commit_depth
         self.commit_depth = self.depth
         self.depth += 1
-        result = parser(*args, **kwargs)
+        return old_depth
+    
+    def leave_tri(self, old_depth):
         self.commit()
         self.commit_depth = old_depth
-        return result
     
     def commit(self):
         self.depth = self.commit_depth
@@ -192,40 +412,394 @@ class BufferWalker(object):
             self._cut()
     
     def _cut(self):
-        self.buffer = self.buffer[self.index:]
-        self.len = len(self.buffer)
-        self.offset += self.index
-        self.index = 0
+        self.offset = self.base + self.index
+        keep = self.offset
+        if self.pins:
+            keep = min(keep, self.pins[0])
+        trim = keep - self.base
+        if trim:
+            self.buffer = self.buffer[trim:]
+            self.len = len(self.buffer)
+            self.base = keep
+            self.index -= trim
         self.depth = 0
+        if self.events:
+            self.deliver()
         self.diag.cut(self.pos())
     
+    def tell(self):
+        """Returns the absolute index of the current token"""
+        return self.base + self.index
+    
+    def span(self, parser):
+        start = self.tell()
+        parser()
+        return start, self.tell()
+    
+    def capture(self, parser):
+        if self.recognise:
+            parser()
+            return Discarded()
+        start = self.tell()
+        self.pins.append(start)
+        try:
+            parser()
+        finally:
+            self.pins.pop()
+        end = self.tell()
+        if self.sequence is not None:
+            return self.sequence[start:end]
+        return [t for t, p in self.buffer[start - self.base:end - self.base]]
+    
     def choice(self, *parsers):
         if not parsers:
             return
-        start_offset = self.offset
-        start_index = self.index
-        start_depth = self.depth
-        start_token = self.peek()
-        start_pos = self.pos()
-        failures = []
+        point = self.choice_point()
         for parser in parsers:
             try:
                 return parser()
             except NoMatch, e:
-                if self.depth < start_depth:
-                    raise Exception("Picoparse: Internal error")
-                if not failures or e.pos > failures[0].pos:
-                    failures = [e]
-                elif e.pos == failures[0].pos:
-                    failures.append(e)
-                if self.offset != start_offset:
-                    if FailedAfterCutting not in e.flags:
-                        e.flags.append(FailedAfterCutting)
+                if not self.backtrack(point, e):
                     break
-                if self.depth > start_depth:
-                    self.depth = start_depth
-                self.index = start_index
-        raise NoMatch.join(failures)
+        raise NoMatch.join(point[3])
+    
+    def choice_point(self):
+        """Records the state a choice rewinds to between alternatives.
+        
+        failures is the list of failures seen so far, which backtrack fills in.
+        """
+        return self.offset, self.base + self.index, self.depth, [], self.emitted
+    
+    def backtrack(self, point, e):
+        """Rewinds to point after the NoMatch e, returning False if a cut since point 
+        means no other alternative may be tried.
+        """
+        start_offset, start, start_depth, failures, start_emitted = point
+        if self.depth < start_depth:
+            raise Exception("Picoparse: Internal error")
+        if not failures or e.pos > failures[0].pos:
+            failures[:] = [e]
+        elif e.pos == failures[0].pos:
+            failures.append(e)
+        if self.offset != start_offset:
+            if FailedAfterCutting not in e.flags:
+                e.flags.append(FailedAfterCutting)
+            return False
+        if self.depth > start_depth:
+            self.depth = start_depth
+        self.index = start - self.base
+        if self.emitted != start_emitted:
+            self.retract(start_emitted)
+        return True
+    
+    # Repetition. These loops rewind the walker directly rather than going through 
+    # choice, so an iteration that succeeds allocates nothing beyond its result.
+    
+    def many(self, parser, results=None):
+        """Applies parser until it fails, appending the results to results"""
+        if results is None:
+            results = []
+        append = results.append
+        while self.peek() is not EndOfFile:
+            start_offset = self.offset
+            start = self.base + self.index
+            start_depth = self.depth
+            start_emitted = self.emitted
+            try:
+                append(parser())
+            except NoMatch, e:
+                point = (start_offset, start, start_depth, [], start_emitted)
+                if not self.backtrack(point, e):
+                    raise NoMatch.join(point[3])
+                break
+        return results
+    
+    def many_until(self, these, term, results=None):
+        """Applies these until term matches, returning the results of these and term"""
+        if results is None:
+            results = []
+        append = results.append
+        while True:
+            start_offset = self.offset
+            start = self.base + self.index
+            start_depth = self.depth
+            start_emitted = self.emitted
+            try:
+                return results, term()
+            except NoMatch, e:
+                point = (start_offset, start, start_depth, [], start_emitted)
+                if not self.backtrack(point, e):
+                    raise NoMatch.join(point[3])
+            try:
+                append(these())
+            except NoMatch, e:
+                self.backtrack(point, e)
+                raise NoMatch.join(point[3])
+    
+    def sep1(self, parser, separator, results=None):
+        """Applies parser one or more times, with separator between each"""
+        if results is None:
+            results = []
+        results.append(parser())
+        append = results.append
+        while self.peek() is not EndOfFile:
+            start_offset = self.offset
+            start = self.base + self.index
+            start_depth = self.depth
+            start_emitted = self.emitted
+            old_depth = self.enter_tri()
+            try:
+                separator()
+                value = parser()
+            except NoMatch, e:
+                self.commit_depth = old_depth
+                point = (start_offset, start, start_depth, [], start_emitted)
+                if not self.backtrack(point, e):
+                    raise NoMatch.join(point[3])
+                break
+            self.leave_tri(old_depth)
+            append(value)
+        return results
+    
+    # Events. emit holds events back until the input they were emitted over is cut, so 
+    # the sink never sees an event from an alternative that is later backtracked out of.
+    # settled counts the pending events emitted outside any tri, which are over input 
+    # already committed to; they are still delivered if the parse goes on to fail. The 
+    # failures recover records are held back in the same way.
+    
+    def set_sink(self, sink):
+        """Sends the events given to emit to sink.
+        
+        sink may be a function, which is called with the kind and value of each event, or 
+        an object with a put method (a Queue) or an append method (a list), which is given 
+        (kind, value) tuples.
+        """
+        if not callable(sink):
+            put = getattr(sink, 'put', None) or sink.append
+            sink = lambda kind, value: put((kind, value))
+        self.sink = sink
+        if self.events is None:
+            self.events = []
+            self.settled = 0
+    
+    def set_errors(self, errors):
+        """Adds the failures recover records to the list errors"""
+        self.errors = errors
+        if self.events is None:
+            self.events = []
+            self.settled = 0
+    
+    def emit(self, kind, value):
+        if self.sink is not None:
+            self._hold((kind, value))
+    
+    def _hold(self, event):
+        events = self.events
+        events.append(event)
+        self.emitted += 1
+        if not self.depth:
+            self.settled = len(events)
+    
+    def deliver(self, count=None):
+        """Sends the pending events, or the first count of them, to the sink"""
+        events = self.events
+        if count is not None:
+            events = events[:count]
+        self.events = []
+        self.settled = 0
+        sink = self.sink
+        for kind, value in events:
+            if kind is _recovered:
+                self.errors.append(value)
+            else:
+                sink(kind, value)
+    
+    def retract(self, emitted):
+        """Drops the pending events emitted after the first emitted events"""
+        events = self.events
+        del events[max(len(events) - (self.emitted - emitted), 0):]
+        self.emitted = emitted
+        if self.settled > len(events):
+            self.settled = len(events)
+    
+    def set_budget(self, max_steps=None, deadline=None):
+        """Starts counting steps in a new Budget, which is returned.
+        
+        The counting versions of next, choice_point and backtrack are installed on this 
+        walker only, so a walker without a budget does no counting at all.
+        """
+        budget = self.budget = Budget(self, max_steps, deadline)
+        next, choice_point, backtrack = self.next, self.choice_point, self.backtrack
+        check = budget.check
+        def counted_next():
+            budget.reads += 1
+            check()
+            return next()
+        def counted_choice_point():
+            budget.choices += 1
+            check()
+            return choice_point()
+        def counted_backtrack(point, e):
+            rewound = backtrack(point, e)
+            if rewound:
+                budget.rewinds += 1
+                check()
+            return rewound
+        self.next = counted_next
+        self.choice_point = counted_choice_point
+        self.backtrack = counted_backtrack
+        return budget
+    
+    def record_error(self, e):
+        """Adds the NoMatch e, with its message, to the list of errors once the input it 
+        was recovered over is cut. It is dropped if that input is backtracked out of."""
+        e.message = getattr(self.diag, 'generate_error_message', lambda x: None)(e)
+        self._hold((_recovered, e))
+    
+    def remaining(self):
+        tokens = []
+        while self.peek() is not EndOfFile:
+            tokens.append(self.peek())
+            self.next()
+        return tokens
+    
+    def unread(self):
+        """Returns a Remaining iterator over the tokens that have not been parsed. 
+        
+        Unlike remaining nothing more is read from the source until the iterator is 
+        advanced, and the walker should not be used after.
+        """
+        return Remaining(self._unread(), self.tell())
+    
+    def _unread(self):
+        for t, p in self.buffer[self.index:]:
+            if t is EndOfFile:
+                return
+            yield t
+        for t, p in self.source:
+            yield t
+
+
+class Remaining(object):
+    """An iterator over the input left unread by a parse, which reads from the input only 
+    as it is advanced.
+    
+    offset is the absolute index of its first token, so where the input is a sequence 
+    the rest of it can be sliced off directly.
+    """
+    def __init__(self, tokens, offset):
+        self.tokens = tokens
+        self.offset = offset
+    
+    def __iter__(self):
+        return self
+    
+    def next(self):
+        return self.tokens.next()
+
+
+class SequenceDiagnostics(object):
+    """Reports the slice of a SequenceWalker's input around a failure.
+    
+    Nothing is stored beyond a reference to the sequence itself.
+    """
+    def __init__(self, sequence, context=20):
+        self.sequence = sequence
+        self.context = context
+    
+    def generate_error_message(self, noMatch):
+        return noMatch.default_message \
+               + "\n" + repr(self.window(noMatch.pos))
+    
+    def window(self, pos):
+        """Returns the part of the sequence within context of pos"""
+        if pos is EndOfFile:
+            pos = len(self.sequence) + 1
+        window = self.sequence[max(pos - 1 - self.context, 0):pos + self.context]
+        return getattr(window, 'tobytes', lambda: window)()
+    
+    def cut(self, pos):
+        pass
+
+
+class SequenceWalker(BufferWalker):
+    """SequenceWalker provides the BufferWalker interface directly over a sequence.
+    
+    Anything that supports len and indexing (strings, lists, memoryviews) can be walked 
+    without copying it token by token into a buffer. Positions are 1-based indexes into 
+    the sequence, the same as DefaultDiagnostics reports. 
+    
+    Here index is the absolute index of the current token and offset is the index of the 
+    last cut; len may be lowered to make the walker treat the rest of the sequence as 
+    though it were not there.
+    """
+    def __init__(self, sequence, diag=None):
+        if diag is None:
+            diag = SequenceDiagnostics(sequence)
+        self.sequence = sequence
+        self.index = 0
+        self.len = len(sequence)
+        self.depth = 0
+        self.offset = 0
+        self.base = 0
+        self.commit_depth = 0
+        self.diag = diag
+        self.max_lookahead = None
+        self.errors = None
+        self.budget = None
+        self.sink = None
+        self.events = None
+        self.emitted = 0
+        self.recognise = False
+    
+    def current(self):
+        if self.index < self.len:
+            return self.sequence[self.index], self.index + 1
+        return (EndOfFile, EndOfFile)
+    
+    def peek(self):
+        if self.index < self.len:
+            return self.sequence[self.index]
+        return EndOfFile
+    
+    def pos(self):
+        if self.index < self.len:
+            return self.index + 1
+        return EndOfFile
+    
+    def lookahead(self, n):
+        i = self.index + n
+        if i < self.len:
+            return self.sequence[i]
+        return EndOfFile
+    
+    def _cut(self):
+        self.offset = self.index
+        self.depth = 0
+        if self.events:
+            self.deliver()
+    
+    def tell(self):
+        return self.index
+    
+    def capture(self, parser):
+        if self.recognise:
+            parser()
+            return Discarded()
+        start = self.index
+        parser()
+        return self.sequence[start:self.index]
+    
+    def remaining(self):
+        tokens = list(self.sequence[self.index:self.len])
+        self.index = self.len
+        self._cut()
+        return tokens
+    
+    def _unread(self):
+        sequence = self.sequence
+        for i in xrange(self.index, self.len):
+            yield sequence[i]
 
 local_ps = threading.local()
 
@@ -245,23 +819,73 @@ def desc(name):
         return decorated
     return decorator
 
-def p(name, parser, *args1, **kwargs1):
-    if callable(name):
-        return partial(name, parser, *args1, **kwargs1)
+class Parser(_partial):
+    """A parser function with some of its arguments already supplied.
+    
+    Parser is functools.partial with no per instance overhead, so calling one costs no 
+    more than calling partial. Parsers can be combined with operators:
+     - a | b is choice(a, b)
+     - a >> b is cue(a, b); it runs both and returns the result of b
+    Chains of either operator are flattened, so a | b | c is choice(a, b, c).
+    """
+    __slots__ = ()
+    
+    def _operands(self, combinator):
+        if self.func is combinator and not self.keywords:
+            return self.args
+        return (self,)
     
-    def p_desc(*args2, **kwargs2):
-        cur_pos = pos()
+    def __or__(self, other):
+        return Parser(choice, *(self._operands(choice) + _operands(other, choice)))
+    
+    def __ror__(self, other):
+        return Parser(choice, other, *self._operands(choice))
+    
+    def __rshift__(self, other):
+        return Parser(cue, *(self._operands(cue) + _operands(other, cue)))
+    
+    def __rrshift__(self, other):
+        return Parser(cue, other, *self._operands(cue))
+
+def _operands(parser, combinator):
+    if isinstance(parser, Parser):
+        return parser._operands(combinator)
+    return (parser,)
+
+partial = Parser
+
+
+class Described(Parser):
+    """A Parser that reports failures at its starting position as expecting description.
+    """
+    __slots__ = ()
+    
+    def __init__(self, description, func, *args, **keywords):
+        self.description = description
+    
+    def __new__(cls, description, func, *args, **keywords):
+        return Parser.__new__(cls, func, *args, **keywords)
+    
+    @property
+    def named(self):
+        return (self.func, self.args, self.keywords or {})
+    
+    def _operands(self, combinator):
+        return (self,)
+    
+    def __call__(self, *args, **kwargs):
+        cur_pos = local_ps.value.pos()
         try:
-            args = args1 + args2
-            kwargs = {}
-            kwargs.update(kwargs1)
-            kwargs.update(kwargs2)
-            return parser(*args, **kwargs)
+            return Parser.__call__(self, *args, **kwargs)
         except NoMatch, e:
             if e.pos == cur_pos:
-                e.expecting = [name]
+                e.expecting = [self.description]
             raise
-    return p_desc
+
+def p(name, parser, *args1, **kwargs1):
+    if callable(name):
+        return Parser(name, parser, *args1, **kwargs1)
+    return Described(name, parser, *args1, **kwargs1)
 
 next = lambda: local_ps.value.next()
 peek = lambda: local_ps.value.peek()
@@ -271,18 +895,109 @@ choice = lambda *options: local_ps.value.choice(*options)
 is_eof = lambda: bool(local_ps.value)
 pos = lambda: local_ps.value.pos()
 diag = lambda: local_ps.value.diag
+emit = lambda kind, value: local_ps.value.emit(kind, value)
+
+def _tri(parser, *args, **kwargs):
+    return local_ps.value.tri(parser, *args, **kwargs)
+
+class Tried(Parser):
+    """The Parser tri returns; tried is the parser it wraps."""
+    __slots__ = ()
+    
+    def __new__(cls, parser):
+        return Parser.__new__(cls, _tri, parser)
+    
+    @property
+    def tried(self):
+        return self.args[0]
+
+def _keep_values(parser, *args, **kwargs):
+    walker = local_ps.value
+    if not walker.recognise:
+        return parser(*args, **kwargs)
+    walker.recognise = False
+    try:
+        return parser(*args, **kwargs)
+    finally:
+        walker.recognise = True
+
+def keep_values(parser):
+    """Returns parser made to build its values even when run by validate.
+    
+    Use it, as a decorator or around a partial, for the parts of a grammar whose code 
+    reads the results of the parsers it calls; see validate.
+    """
+    return Parser(_keep_values, parser)
 
 def tri(parser):
-    def tri_block(*args, **kwargs):
-        return local_ps.value.tri(parser, *args, **kwargs)
-    return tri_block
+    return Tried(parser)
 
-def run_parser(parser, input, wrapper=None):
+def run_parser(parser, input, wrapper=None, max_lookahead=None, errors=None, 
+               max_steps=None, deadline=None, sink=None, lazy=False):
+    """Runs parser over input, returning the result and the remaining input.
+    
+    If errors is a list, failures handled by recover are added to it and parsing 
+    continues; see recover. Like events, they are added as the input they were 
+    recovered over is committed to.
+    
+    max_steps and deadline (a time.time() value) bound the work done by the parse; 
+    BudgetExceeded is raised once either is exceeded. See Budget.
+    
+    If sink is given, the events the grammar emits are sent to it as the input they 
+    were emitted over is committed to; see BufferWalker.set_sink. If the parse fails, 
+    the events emitted since the last commit outside any tri are still delivered before 
+    NoMatch is raised; those from inside the tri blocks that were open are dropped.
+    
+    With lazy, the remaining input is returned as a Remaining iterator rather than a 
+    list, so none of it is read unless the caller goes on to iterate over it.
+    """
+    walker = BufferWalker(input, wrapper, max_lookahead)
+    if errors is not None:
+        walker.set_errors(errors)
+    if max_steps is not None or deadline is not None:
+        walker.set_budget(max_steps, deadline)
+    if sink is not None:
+        walker.set_sink(sink)
+    return run_walker(parser, walker, lazy)
+
+def validate(parser, input, wrapper=None, max_lookahead=None, max_steps=None, 
+             deadline=None):
+    """Checks that parser matches the start of input, without building its result.
+    
+    Returns the number of tokens parser consumed; the rest of the input is left unread. 
+    A failure raises NoMatch, as run_parser does.
+    
+    The walker is put in recognise mode, so the repetition combinators, string and 
+    capture return empty lists rather than what they matched, and capture doesn't hold 
+    on to its input. Grammar code that looks at those values (to compare a closing tag 
+    with an opening one, or convert digits to a number) must be wrapped in keep_values, 
+    or it will see the empty lists.
+    """
+    walker = BufferWalker(input, wrapper, max_lookahead)
+    walker.recognise = True
+    if max_steps is not None or deadline is not None:
+        walker.set_budget(max_steps, deadline)
+    return _run(lambda: (parser(), walker.tell())[1], walker)
+
+def run_walker(parser, walker, lazy=False):
+    """Runs parser over the input of an already constructed walker.
+    
+    Returns the result and the remaining input, as run_parser does.
+    """
+    if lazy:
+        return _run(lambda: (parser(), walker.unread()), walker)
+    return _run(lambda: (parser(), remaining()), walker)
+
+def _run(parse, walker):
     old = getattr(local_ps, 'value', None)
-    local_ps.value = BufferWalker(input, wrapper)
+    local_ps.value = walker
     try:
-        result = parser(), remaining()
+        result = parse()
+        if walker.events:
+            walker.deliver()
     except NoMatch, e:
+        if walker.events:
+            walker.deliver(walker.settled)
         e.message = getattr(local_ps.value.diag, 'generate_error_message', lambda x: None)(e)
         raise
     finally:
@@ -330,7 +1045,7 @@ def one_of(these):
     ch = peek()
     try:
         if (ch is EndOfFile) or (ch not in these):
-            fail(list(these))
+            fail([Expectation(list, these)])
     except TypeError:
         if ch != these:
             fail([these])
@@ -343,17 +1058,21 @@ def not_one_of(these):
     The negative of one_of. 
     """
     ch = peek()
-    desc = "not_one_of" + repr(these)
     try:
         if (ch is EndOfFile) or (ch in these):
-            fail([desc])
+            fail([Expectation(_describe_not_one_of, these)])
     except TypeError:
         if ch != these:
-            fail([desc])
+            fail([Expectation(_describe_not_one_of, these)])
     next()
     return ch
 
+def _describe_not_one_of(these):
+    return ["not_one_of" + repr(these)]
+
 def _fun_to_str(f):
+    while isinstance(f, _partial):
+        f = f.func
     name = getattr(f, "__name__", "???")
     pos = getattr(f, "func_code", False)
     if pos:
@@ -362,6 +1081,9 @@ def _fun_to_str(f):
         pos = "???"
     return name + " at " + pos
 
+def _describe_satisfies(guard):
+    return ["<satisfies predicate " + _fun_to_str(guard) + ">"]
+
 def satisfies(guard):
     """Returns the current token if it satisfies the guard function provided.
     
@@ -370,15 +1092,150 @@ def satisfies(guard):
     """
     i = peek()
     if (i is EndOfFile) or (not guard(i)):
-        fail(["<satisfies predicate " + _fun_to_str(guard) + ">"])
+        fail([Expectation(_describe_satisfies, guard)])
     next()
     return i
 
+def satisfies_cached(guard, limit=4096):
+    """Returns a parser that acts as partial(satisfies, guard), for a guard that is a pure 
+    function of a single token.
+    
+    guard is called once per distinct token and its answer remembered, in a table of at 
+    most limit tokens. Tokens that can't be hashed are passed to guard every time.
+    
+    This only pays for a guard that is slow to compute; a cheap one, such as a call to 
+    str.isalpha, costs about as much as the table lookup (see 
+    examples/satisfies_benchmark.py).
+    """
+    return Parser(_satisfies_cached, guard, {EndOfFile: False}, limit)
+
+def _satisfies_cached(guard, table, limit):
+    walker = local_ps.value
+    t = walker.peek()
+    try:
+        ok = table[t]
+    except KeyError:
+        ok = bool(guard(t))
+        if len(table) <= limit:
+            table[t] = ok
+    except TypeError:
+        ok = guard(t)
+    if not ok:
+        walker.fail([Expectation(_describe_satisfies, guard)])
+    walker.next()
+    return t
+
+_end_of_word = object()
+
+def keyword_set(words, longest_match=True, boundary=None):
+    """Returns a parser that matches any one of words, returning the word matched.
+    
+    The words are compiled into a trie, and the input is matched against it in a 
+    single pass of lookahead; nothing is consumed unless a word matches. With 
+    longest_match the longest matching word is taken, otherwise the shortest. 
+    
+    boundary is a collection of tokens, or a predicate, for tokens that may not 
+    directly follow a word; eg, keyword_set(['if', 'in'], boundary=str.isalnum) will 
+    not match the start of 'int'.
+    """
+    words = list(words)
+    trie = {}
+    for word in words:
+        node = trie
+        for t in word:
+            node = node.setdefault(t, {})
+        node[_end_of_word] = word
+    if boundary is not None and not callable(boundary):
+        boundary = boundary.__contains__
+    parser = Parser(_keyword_set, trie, sorted(words), longest_match, boundary)
+    if words and all(words):
+        parser.first_set = frozenset(word[0] for word in words)
+    return parser
+
+def _keyword_set(trie, expecting, longest_match, boundary):
+    walker = local_ps.value
+    node = trie
+    found = None
+    i = 0
+    while True:
+        t = walker.lookahead(i)
+        if _end_of_word in node:
+            if boundary is None or t is EndOfFile or not boundary(t):
+                found = node[_end_of_word]
+                length = i
+                if not longest_match:
+                    break
+        if t is EndOfFile:
+            break
+        try:
+            node = node.get(t)
+        except TypeError:
+            break
+        if node is None:
+            break
+        i += 1
+    if found is None:
+        walker.fail(expecting)
+    for i in range(length):
+        walker.next()
+    return found
+
+def span(parser):
+    """Runs parser, returning the absolute (start, end) indexes of the input it consumed 
+    instead of its result.
+    """
+    return local_ps.value.span(parser)
+
+def capture(parser):
+    """Runs parser, returning the input it consumed instead of its result.
+    
+    If the input is a sequence (a string, list, memoryview...) this is a slice of it, 
+    otherwise it is a list of the tokens. Either way, parser is only used to recognise 
+    the input, so it may as well avoid building a result.
+    """
+    return local_ps.value.capture(parser)
+
+def recover(parser, sync, default=None):
+    """Runs parser, recovering from a failure by skipping input up to and including a 
+    match of sync, and returning default.
+    
+    Recovery only happens when the parse was started with an errors list (see 
+    run_parser); the failure is added to that list, so a single run can report every 
+    error in the input along with a partial result. Otherwise recover is just parser.
+    
+    Input is skipped from where parser started if it has not committed since, or else 
+    from where it failed. sync should be a simple parser, such as a separator or closing 
+    delimiter, that does not commit.
+    
+    The failure is only added to errors once the input recovered over is committed to, 
+    so an enclosing choice that backtracks out of it leaves errors unchanged.
+    """
+    walker = local_ps.value
+    if walker.errors is None:
+        return parser()
+    point = walker.choice_point()
+    commit_depth = walker.commit_depth
+    try:
+        return parser()
+    except NoMatch, e:
+        walker.backtrack(point, e)
+        walker.depth = point[2]
+        walker.commit_depth = commit_depth
+        walker.record_error(e)
+    skipped = object()
+    sync = tri(sync)
+    while walker and optional(sync, skipped) is skipped:
+        walker.next()
+    return default
+
 def optional(parser, default=None):
     """Tries to apply the provided parser, returning default if the parser fails.
     """
     return choice(parser, lambda: default)
 
+def _describe_not(parser):
+    return ["not " + _fun_to_str(parser)]
+
 def not_followed_by(parser):
     """Succeeds if the given parser cannot consume input"""
     @tri
@@ -386,75 +1243,76 @@ def not_followed_by(parser):
         failed = object()
         result = optional(tri(parser), failed)
         if result != failed:
-            fail(["not " + _fun_to_str(parser)])
+            fail([Expectation(_describe_not, parser)])
     choice(not_followed_by_block)
 
 eof = partial(not_followed_by, any_token)
 
-def many(parser):
+# The repetition combinators take a discard flag. With discard=True the results of 
+# parser are dropped as they are made and an empty Discarded list is returned, so 
+# repeating over any amount of input takes constant memory. Only this repetition's own 
+# list is affected: parser, and anything it calls, still builds its results as usual, 
+# so discard is only for sites whose list nothing reads, such as a grammar that reports 
+# through emit, or a skip over whitespace. A walker in recognise mode (see validate) 
+# discards at every site.
+
+def _results(walker, discard):
+    if discard or walker.recognise:
+        return Discarded()
+    return []
+
+def many(parser, discard=False):
     """Applies the parser to input zero or more times.
     
     Returns a list of parser results.
     """
-    results = []
-    terminate = object()
-    while local_ps.value:
-        result = optional(parser, terminate)
-        if result == terminate:
-            break
-        results.append(result)
-    return results
+    walker = local_ps.value
+    return walker.many(parser, _results(walker, discard))
 
-def many1(parser):
+def many1(parser, discard=False):
     """Like many, but must consume at least one of parser"""
-    return [parser()] + many(parser)
+    walker = local_ps.value
+    results = _results(walker, discard)
+    results.append(parser())
+    return walker.many(parser, results)
 
-def _tag(t, parser):
-    def tagged():
-        return t, parser()
-    return tagged
-
-def many_until(these, term):
+def many_until(these, term, discard=False):
     """Consumes as many of these as it can until it term is encountered.
     
     Returns a tuple of the list of these results and the term result 
     """
-    results = []
-    while True:
-        stop, result = choice(_tag(True, term),
-                              _tag(False, these))
-        if stop:
-            return results, result
-        else:
-            results.append(result)
+    walker = local_ps.value
+    return walker.many_until(these, term, _results(walker, discard))
 
-def many_until1(these, term):
+def many_until1(these, term, discard=False):
     """Like many_until but must consume at least one of these.
     """
-    first = [these()]
-    these_results, term_result = many_until(these, term)
-    return (first + these_results, term_result)
+    walker = local_ps.value
+    results = _results(walker, discard)
+    results.append(these())
+    return walker.many_until(these, term, results)
 
-def sep1(parser, separator):
+def sep1(parser, separator, discard=False):
     """Like sep but must consume at least one of parser.
     """
-    first = [parser()]
-    def inner():
-        separator()
-        return parser()
-    return first + many(tri(inner))
+    walker = local_ps.value
+    return walker.sep1(parser, separator, _results(walker, discard))
 
-def sep(parser, separator):
+def sep(parser, separator, discard=False):
     """Consumes zero or more of parser, separated by separator.
     
     Returns a list of parser's results
     """
-    return optional(partial(sep1, parser, separator), [])
+    return optional(partial(sep1, parser, separator, discard), 
+                    _results(local_ps.value, discard))
 
-def n_of(parser, n):
+def n_of(parser, n, discard=False):
     """Consumes n of parser, returning a list of the results.
     """
-    return [parser() for i in range(n)]
+    results = _results(local_ps.value, discard)
+    for i in range(n):
+        results.append(parser())
+    return results
 
 def string(string):
     """Iterates over string, matching input to the items provided.
@@ -468,7 +1326,7 @@ def string(string):
     note, If you wish to match caseless strings as in the example, use 
     picoparse.text.caseless_string.
     """
-    found = []
+    found = _results(local_ps.value, False)
     for c in string:
         found.append(one_of(c))
     return found
@@ -495,11 +1353,7 @@ def follow(*parsers):
 def remaining():
     """Returns the remaining input that has not been parsed.
     """
-    tokens = []
-    while peek() is not EndOfFile:
-        tokens.append(peek())
-        next()
-    return tokens
+    return local_ps.value.remaining()
 
 def seq(*sequence):
     """Runs a series of parsers in sequence optionally storing results in a returned dictionary.
@@ -0,0 +1,219 @@
+"""Grammar analysis for picoparse.
+
+These functions look inside parsers built with partial, p and tri to work out which 
+tokens each parser can start with (its first set). Where the alternatives of a choice 
+start with disjoint tokens, predict can pick the only viable alternative from a single 
+token of lookahead instead of trying each one in turn and rewinding.
+
+Parsers written as plain functions are opaque to the analysis; use firsts to declare 
+what they start with.
+"""
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+from picoparse import partial, p, tri, choice, peek, fail, local_ps
+from picoparse import one_of, string, cue, follow, seq, many1, many_until, many_until1
+from picoparse import sep1, n_of
+
+def firsts(tokens):
+    """Decorator declaring the set of tokens a parser can start with.
+    
+    The parser must not be able to match empty input. For example:
+    
+        @firsts('<')
+        @tri
+        def element(): ...
+    """
+    def decorator(parser):
+        parser.first_set = frozenset(tokens)
+        return parser
+    return decorator
+
+def _union(*sets):
+    if None in sets:
+        return None
+    return frozenset().union(*sets)
+
+def _first_of_one_of(these):
+    # other containers (char classes, xrange...) may not list the tokens they hold
+    if isinstance(these, (basestring, list, tuple, set, frozenset, dict)):
+        return frozenset(these)
+    return None
+
+def _first_of_string(s):
+    for c in s:
+        return _first_of_one_of(c)
+    return None
+
+def _first_of_seq(*sequence):
+    if not sequence:
+        return None
+    first = sequence[0]
+    if not callable(first):
+        first = first[1]
+    return first_set(first)
+
+_rules = {
+    one_of: _first_of_one_of,
+    string: _first_of_string,
+    choice: lambda *parsers: _union(*map(first_set, parsers)),
+    cue: lambda *parsers: parsers and first_set(parsers[0]) or None,
+    follow: lambda *parsers: parsers and first_set(parsers[0]) or None,
+    seq: _first_of_seq,
+    many1: lambda parser, discard=False: first_set(parser),
+    sep1: lambda parser, separator, discard=False: first_set(parser),
+    many_until: lambda these, term, discard=False: _union(first_set(these), first_set(term)),
+    many_until1: lambda these, term, discard=False: first_set(these),
+    n_of: lambda parser, n, discard=False: n > 0 and first_set(parser) or None,
+}
+
+def _first_of_call(func, args, kwargs):
+    while isinstance(func, partial):
+        args = func.args + args
+        func = func.func
+    rule = _rules.get(func)
+    if rule is None:
+        return None
+    try:
+        return rule(*args, **(kwargs or {}))
+    except TypeError:
+        return None
+
+def first_set(parser):
+    """Returns the frozenset of tokens parser can start with.
+    
+    Returns None if the analysis cannot tell, or if parser may match without consuming 
+    any input (in which case it can be followed by anything).
+    """
+    declared = getattr(parser, 'first_set', None)
+    if declared is not None:
+        return declared
+    tried = getattr(parser, 'tried', None)
+    if tried is not None:
+        return first_set(tried)
+    named = getattr(parser, 'named', None)
+    if named is not None:
+        return _first_of_call(*named)
+    if isinstance(parser, partial):
+        return _first_of_call(parser.func, parser.args, parser.keywords)
+    return None
+
+
+class predict(object):
+    """A choice that dispatches on the current token.
+    
+    Each alternative whose first set is known is only tried when the current token is 
+    in that set; alternatives that cannot be analysed are always tried. When exactly 
+    one alternative remains it is called directly, without a choice point, so a failure 
+    does not go on to attempt the others. Alternatives are still tried in order.
+    
+    The first sets are worked out on the first call, so alternatives may refer to 
+    parsers that are defined later in a module.
+    
+    With commit, the grammar is taken to be predictive: once the current token picks an 
+    alternative, that alternative is committed to. If no enclosing tri is holding the 
+    input back (and no alternative is unanalysable) a tri around the chosen alternative 
+    is skipped, so its input is freed as it is consumed rather than kept until it 
+    finishes. A failure in it can then no longer be backtracked out of by enclosing 
+    choices, so only use commit where they have nothing else to offer for that token.
+    """
+    def __init__(self, *parsers, **kwargs):
+        self.parsers = parsers
+        self.commit = kwargs.pop('commit', False)
+        if kwargs:
+            raise TypeError("unexpected keyword arguments " + ", ".join(kwargs))
+        self.dispatch = None
+    
+    def _compile(self):
+        sets = map(first_set, self.parsers)
+        self.fallback = tuple(pr for pr, fs in zip(self.parsers, sets) if fs is None)
+        self.expecting = sorted(_union(*[fs for fs in sets if fs is not None]))
+        dispatch = {}
+        for token in self.expecting:
+            dispatch[token] = tuple(pr for pr, fs in zip(self.parsers, sets) 
+                                    if fs is None or token in fs)
+        self.dispatch = dispatch
+    
+    @property
+    def first_set(self):
+        return _union(*map(first_set, self.parsers))
+    
+    def __call__(self):
+        if self.dispatch is None:
+            self._compile()
+        token = peek()
+        try:
+            candidates = self.dispatch.get(token, self.fallback)
+        except TypeError:
+            candidates = self.parsers
+        if len(candidates) == 1:
+            parser = candidates[0]
+            if self.commit and not self.fallback and not local_ps.value.depth:
+                parser = getattr(parser, 'tried', parser)
+            return parser()
+        if not candidates:
+            fail(self.expecting)
+        return choice(*candidates)
+
+def optimise(parser, commit=False):
+    """Returns a copy of a parser tree with each choice replaced by predict.
+    
+    Only parsers built with partial, p and tri are rewritten; parsers called from inside 
+    the body of a function are left alone. Declared first sets are carried over. commit 
+    is given to each predict; see predict.
+    """
+    if isinstance(parser, predict):
+        return predict(*[optimise(pr, commit) for pr in parser.parsers], 
+                       commit=commit or parser.commit)
+    declared = getattr(parser, 'first_set', None)
+    tried = getattr(parser, 'tried', None)
+    named = getattr(parser, 'named', None)
+    if tried is not None:
+        result = tri(optimise(tried, commit))
+    elif named is not None:
+        func, args, kwargs = _optimise_call(commit, *named)
+        result = p(parser.description, func, *args, **kwargs)
+    elif isinstance(parser, partial):
+        func, args, kwargs = _optimise_call(commit, parser.func, parser.args, 
+                                            parser.keywords)
+        if func is choice and not kwargs:
+            result = predict(*args, commit=commit)
+        else:
+            result = partial(func, *args, **kwargs)
+    else:
+        return parser
+    if declared is not None and not isinstance(result, predict):
+        result.first_set = declared
+    return result
+
+def _optimise_arg(arg, commit):
+    if callable(arg):
+        return optimise(arg, commit)
+    if isinstance(arg, tuple) and len(arg) == 2 and callable(arg[1]):
+        return (arg[0], optimise(arg[1], commit))
+    return arg
+
+def _optimise_call(commit, func, args, kwargs):
+    return (optimise(func, commit), tuple(_optimise_arg(arg, commit) for arg in args), 
+            dict((k, _optimise_arg(v, commit)) for k, v in (kwargs or {}).items()))
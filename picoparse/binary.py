@@ -0,0 +1,174 @@
+"""Binary parsing utilities for picoparse.
+
+These parsers work over bytes held in memory (a str, bytearray, mmap or memoryview) 
+and read many bytes at once, rather than one token at a time through one_of. Fixed 
+size fields are decoded with struct, and runs of bytes are returned as memoryview 
+slices of the input so they are not copied.
+
+The generic parsers (one_of, choice, many and so on) still work, one byte at a time, 
+when run with run_binary_parser.
+"""
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+from struct import Struct
+
+from picoparse import SequenceWalker, run_walker, local_ps
+
+class BinaryWalker(SequenceWalker):
+    """BinaryWalker walks a buffer of bytes, adding bulk reads to SequenceWalker.
+    
+    Tokens are the single bytes produced by indexing a memoryview of the data. Data 
+    with a find method (str, bytearray, mmap) is searched directly; anything else, such 
+    as a memoryview, is searched a chunk of chunk_size bytes at a time, so the input is 
+    never copied as a whole.
+    """
+    chunk_size = 65536
+    
+    def __init__(self, data):
+        try:
+            view = memoryview(data)
+        except TypeError:
+            view = data
+        SequenceWalker.__init__(self, view)
+        if not hasattr(data, 'find'):
+            data = None
+        self.data = data
+    
+    def _advance(self, end):
+        self.index = end
+        if not self.depth:
+            self._cut()
+    
+    def take(self, n):
+        """Consumes n bytes, returning them as a slice of the input"""
+        start = self.index
+        end = start + n
+        if end > self.len:
+            self.fail([str(n) + " bytes"])
+        self._advance(end)
+        return self.sequence[start:end]
+    
+    def unpack(self, fmt):
+        """Consumes and decodes the bytes for a struct.Struct, returning the tuple"""
+        start = self.index
+        end = start + fmt.size
+        if end > self.len:
+            self.fail(["struct " + repr(fmt.format)])
+        self._advance(end)
+        return fmt.unpack_from(self.sequence, start)
+    
+    def until(self, delimiter):
+        """Consumes bytes up to and including delimiter, returning those before it"""
+        start = self.index
+        found = self._find(delimiter, start, self.len)
+        if found < 0:
+            self.fail([delimiter])
+        self._advance(found + len(delimiter))
+        return self.sequence[start:found]
+    
+    def _find(self, delimiter, start, end):
+        if self.data is not None:
+            return self.data.find(delimiter, start, end)
+        overlap = len(delimiter) - 1
+        while start < end:
+            stop = min(start + self.chunk_size, end)
+            found = self.sequence[start:min(stop + overlap, end)].tobytes().find(delimiter)
+            if found >= 0:
+                return start + found
+            start = stop
+        return -1
+    
+    def limited(self, n, parser):
+        """Runs parser over exactly the next n bytes"""
+        end = self.index + n
+        if end > self.len:
+            self.fail([str(n) + " bytes"])
+        old_len = self.len
+        self.len = end
+        try:
+            result = parser()
+        finally:
+            self.len = old_len
+        if self.index != end:
+            self.fail(["end of " + str(n) + " byte block"])
+        return result
+    
+    def remaining(self):
+        rest = self.sequence[self.index:self.len]
+        self.index = self.len
+        self._cut()
+        return rest
+
+def take(n):
+    """Consumes n bytes, returning a memoryview of them.
+    """
+    return local_ps.value.take(n)
+
+def unpack(fmt):
+    """Consumes the bytes for a struct format string, returning the unpacked tuple.
+    """
+    return local_ps.value.unpack(Struct(fmt))
+
+def _field(fmt):
+    fmt = Struct(fmt)
+    def field():
+        return local_ps.value.unpack(fmt)[0]
+    field.__name__ = fmt.format
+    return field
+
+u8 = _field('B')
+i8 = _field('b')
+u16 = _field('>H')
+i16 = _field('>h')
+u32 = _field('>I')
+i32 = _field('>i')
+u64 = _field('>Q')
+i64 = _field('>q')
+u16le = _field('<H')
+i16le = _field('<h')
+u32le = _field('<I')
+i32le = _field('<i')
+u64le = _field('<Q')
+i64le = _field('<q')
+
+def length_prefixed(parser, length=u32):
+    """Reads a length with the length parser, then applies parser to exactly that many 
+    bytes. 
+    
+    parser sees the end of the block as the end of input, and must consume all of it.
+    """
+    return local_ps.value.limited(length(), parser)
+
+def bytes_until(delimiter):
+    """Consumes bytes up to and including delimiter, returning a memoryview of the bytes 
+    before it.
+    """
+    return local_ps.value.until(delimiter)
+
+def run_binary_parser(parser, data):
+    """Runs parser over bytes in memory, returning the result and a memoryview of the 
+    unparsed remainder.
+    """
+    return run_walker(parser, BinaryWalker(data))
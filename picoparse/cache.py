@@ -0,0 +1,135 @@
+"""Caching of grammar construction results for picoparse.
+
+Grammars that do a lot of work at import time (eg, the xml example parsing character 
+classes out of the XML spec) can move that work into a builder function decorated with 
+artifact. The builder's result is pickled to disk the first time, and loaded on later 
+imports instead of being rebuilt.
+
+Builders must return picklable data (character tables, ranges, dispatch tables and 
+the like) rather than parser functions; build the parsers from the cached data.
+"""
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import inspect
+import tempfile
+import cPickle as pickle
+from hashlib import sha1
+
+import picoparse
+
+def default_cache_dir():
+    """The cache directory; $PICOPARSE_CACHE, or ~/.cache/picoparse.
+    
+    Setting PICOPARSE_CACHE to an empty string disables the cache.
+    """
+    path = os.environ.get('PICOPARSE_CACHE')
+    if path is None:
+        path = os.path.join(os.path.expanduser('~'), '.cache', 'picoparse')
+    return path
+
+def _source_hash(builder):
+    """Hashes the source file the builder is defined in, so any change to the grammar 
+    module invalidates its artifacts.
+    """
+    try:
+        source = open(inspect.getsourcefile(builder), 'rb').read()
+    except (TypeError, IOError):
+        source = inspect.getsource(builder)
+    return sha1(source).hexdigest()
+
+def artifact_key(builder, args):
+    """Returns the cache key for calling builder with args.
+    
+    The key is in two parts. The first names the call, and the second the versions of 
+    the grammar source, picoparse and Python it was built with; an artifact is replaced 
+    when the second part changes.
+    """
+    call = sha1(builder.__module__ + '.' + builder.__name__)
+    call.update(repr(args))
+    version = sha1(_source_hash(builder))
+    version.update(picoparse.__version__)
+    version.update(repr(sys.version_info[:2]))
+    return call.hexdigest() + '-' + version.hexdigest()
+
+def _load(path):
+    try:
+        with open(path, 'rb') as f:
+            return True, pickle.load(f)
+    except Exception:
+        # a missing, partly written or stale artifact is simply rebuilt
+        return False, None
+
+def _store(path, value):
+    temp = None
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, temp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp, path)
+        _remove_stale(path)
+    except Exception:
+        # caching is an optimisation; an unpicklable result or a read only or full disk 
+        # must not stop the build
+        if temp is not None and os.path.exists(temp):
+            os.remove(temp)
+
+def _remove_stale(path):
+    """Removes the artifacts for the same call as path built by other versions"""
+    directory, name = os.path.split(path)
+    call = name.split('-')[0] + '-'
+    for other in os.listdir(directory):
+        if other.startswith(call) and other != name:
+            try:
+                os.remove(os.path.join(directory, other))
+            except OSError:
+                pass
+
+def artifact(builder):
+    """Decorator that caches the result of builder on disk.
+    
+    The result is keyed by a hash of the source of the module defining builder, the 
+    picoparse version and the repr of the arguments it is called with, so arguments 
+    should be simple values such as strings. Building a new version of an artifact 
+    removes the old one.
+    """
+    def cached_builder(*args):
+        cache_dir = default_cache_dir()
+        if not cache_dir:
+            return builder(*args)
+        path = os.path.join(cache_dir, artifact_key(builder, args) + '.pickle')
+        found, value = _load(path)
+        if not found:
+            value = builder(*args)
+            _store(path, value)
+        return value
+    cached_builder.__name__ = builder.__name__
+    cached_builder.__doc__ = builder.__doc__
+    cached_builder.builder = builder
+    return cached_builder
@@ -0,0 +1,248 @@
+"""Complexity analysis for picoparse grammars.
+
+Backtracking lets a grammar reread the same input many times over, and on the wrong 
+input a grammar that is linear in practice can turn out to be quadratic or exponential. 
+analyse runs rules over families of generated inputs of increasing size, counting the 
+walker's token reads, choices and rewinds (see picoparse.Budget), and reports the rules 
+whose step counts grow faster than the input.
+
+A family is a function from a size n to an input. nested, repeated and near_miss build 
+the common adversarial shapes; families builds all three from a sample of valid input 
+for a rule. For example:
+
+    probes = [('word', word, families('atom ', bad='@'))]
+    for finding in analyse(probes):
+        print finding
+
+Each finding also names the grammar function within the probe whose steps grew the 
+most (see attribute), so the probes can be whole grammars.
+"""
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+from math import log
+
+from picoparse import BufferWalker, NoMatch, BudgetExceeded, local_ps
+
+def nested(open, inner, close):
+    """Inputs with open and close nested n deep around inner"""
+    return lambda n: open * n + inner + close * n
+
+def repeated(unit, suffix=''):
+    """Inputs of n copies of unit, followed by suffix"""
+    return lambda n: unit * n + suffix
+
+def near_miss(unit, bad):
+    """Inputs of n copies of unit, then a bad token where another copy should continue"""
+    return lambda n: unit * n + unit[:-1] + bad
+
+def families(sample, bad=None, open=None, close=None):
+    """Returns the standard families of adversarial inputs built from sample.
+    
+    bad is a token that cannot continue the sample, for near misses (defaults to the 
+    sample's last token doubled up). Give open and close to also include nesting.
+    """
+    if bad is None:
+        bad = sample[-1:] * 2
+    result = [('repeated', repeated(sample)), ('near miss', near_miss(sample, bad))]
+    if open is not None:
+        result.append(('nested', nested(open, sample, close)))
+    return result
+
+def measure(parser, input, max_steps=None, wrapper=None):
+    """Runs parser over input, returning the number of steps it took or None if it 
+    exceeded max_steps. Failing to match is not an error.
+    """
+    walker = BufferWalker(input, wrapper)
+    budget = walker.set_budget(max_steps)
+    old = getattr(local_ps, 'value', None)
+    local_ps.value = walker
+    try:
+        parser()
+    except NoMatch:
+        pass
+    except BudgetExceeded:
+        return None
+    finally:
+        local_ps.value = old
+    return budget.steps
+
+def attribute(parser, input, max_steps=None, wrapper=None):
+    """Runs parser over input as measure does, returning a dict of the number of token 
+    reads and choices made in each grammar function, by "name at file:line".
+    
+    Steps taken by parsers built with partial are counted against the grammar function 
+    that called them, or against None when parser itself made the call. Returns None if 
+    the run exceeded max_steps.
+    """
+    walker = BufferWalker(input, wrapper)
+    walker.set_budget(max_steps)
+    counts = {}
+    top = sys._getframe()
+    def counting(method):
+        def counted(*args):
+            f = sys._getframe(1)
+            while f is not None and f is not top \
+                  and f.f_globals.get('__name__', '').startswith('picoparse'):
+                f = f.f_back
+            if f is None or f is top:
+                rule = None
+            else:
+                code = f.f_code
+                rule = code.co_name + " at " + code.co_filename + ":" + str(code.co_firstlineno)
+            counts[rule] = counts.get(rule, 0) + 1
+            return method(*args)
+        return counted
+    walker.next = counting(walker.next)
+    walker.choice_point = counting(walker.choice_point)
+    old = getattr(local_ps, 'value', None)
+    local_ps.value = walker
+    try:
+        parser()
+    except NoMatch:
+        pass
+    except BudgetExceeded:
+        return None
+    finally:
+        local_ps.value = old
+    return counts
+
+def growth(sizes, steps):
+    """Classifies the growth of steps with sizes.
+    
+    Returns (kind, degree) where kind is 'linear', 'polynomial' or 'exponential', and 
+    degree is the exponent of the best fitting power of the size over the largest sizes. 
+    A None in steps (a run that exceeded its budget) counts as exponential.
+    """
+    if None in steps:
+        return 'exponential', None
+    slopes = [log(float(max(s2, 1)) / max(s1, 1)) / log(float(n2) / n1)
+              for n1, n2, s1, s2 in zip(sizes, sizes[1:], steps, steps[1:])]
+    degree = slopes[-1]
+    if len(slopes) > 1 and degree > slopes[0] + 1:
+        return 'exponential', degree
+    if degree < 1.5:
+        return 'linear', degree
+    return 'polynomial', degree
+
+
+class Finding(object):
+    """A rule whose steps grow super-linearly over a family of inputs.
+    
+    input is the smallest input found in the family whose step count shows the growth. 
+    rules lists (rule, excess) for the grammar functions within the probe, most to 
+    blame first, where excess is the number of steps beyond linear growth between the 
+    two largest sizes measured (see attribute); offender is the first of them.
+    """
+    def __init__(self, rule, family, kind, degree, sizes, steps, input, rules=()):
+        self.rule = rule
+        self.rules = list(rules)
+        self.offender = self.rules and self.rules[0][0] or None
+        self.family = family
+        self.kind = kind
+        self.degree = degree
+        self.sizes = sizes
+        self.steps = steps
+        self.input = input
+    
+    def __str__(self):
+        if self.degree is None:
+            growth = self.kind
+        else:
+            growth = self.kind + " (degree %.1f)" % self.degree
+        return self.rule + " is " + growth + " on " + self.family + " inputs" \
+               + "\nsteps " + ', '.join("%d: %s" % (n, s) for n, s in zip(self.sizes, self.steps)) \
+               + "\nsmallest input " + repr(self.input) \
+               + (self.offender and "\nmostly in " + self.offender or "")
+    
+    __repr__ = __str__
+
+def _smallest(parser, family, sizes, steps, max_steps, wrapper):
+    """Finds the smallest size at which the steps per unit of size reach twice those at 
+    the smallest size tried, or exceed max_steps.
+    """
+    def run(n):
+        return measure(parser, family(n), max_steps, wrapper and wrapper())
+    if steps[0] is None:
+        rate = None
+    else:
+        rate = float(steps[0]) / sizes[0]
+    previous = 0
+    for n in sizes:
+        s = run(n)
+        if s is None or (rate is not None and s > 2 * rate * n):
+            for m in range(previous + 1, n):
+                s = run(m)
+                if s is None or (rate is not None and s > 2 * rate * m):
+                    return family(m)
+            return family(n)
+        previous = n
+    return family(sizes[-1])
+
+def _blame(parser, family, sizes, steps, wrapper):
+    """Ranks the grammar functions in parser by their steps in excess of linear growth 
+    between the two largest sizes that finished.
+    """
+    finished = [n for n, s in zip(sizes, steps) if s is not None]
+    if len(finished) < 2:
+        finished = finished * 2
+    if not finished:
+        return []
+    n1, n2 = finished[-2:]
+    before = attribute(parser, family(n1), None, wrapper and wrapper())
+    after = attribute(parser, family(n2), None, wrapper and wrapper())
+    excess = [(rule, after[rule] - before.get(rule, 0) * float(n2) / n1) for rule in after]
+    excess.sort(key=lambda (rule, e): -e)
+    return [(rule, e) for rule, e in excess if rule is not None and e > 0]
+
+def analyse(probes, sizes=(4, 8, 16, 32, 64), max_steps=1000000, wrapper=None):
+    """Measures each probe at each size, returning a list of Findings for those that 
+    grow super-linearly.
+    
+    probes is a list of (name, parser, families), with families a list of (name, 
+    family) as built by families. wrapper is a diagnostics factory (such as 
+    picoparse.text.TextDiagnostics) for the inputs. Once a run exceeds max_steps, 
+    larger sizes of that family are not tried.
+    """
+    findings = []
+    for rule, parser, rule_families in probes:
+        for family_name, family in rule_families:
+            steps = []
+            for n in sizes:
+                s = measure(parser, family(n), max_steps, wrapper and wrapper())
+                steps.append(s)
+                if s is None:
+                    break
+            tried = sizes[:len(steps)]
+            if len(tried) < 2:
+                kind, degree = 'exponential', None
+            else:
+                kind, degree = growth(tried, steps)
+            if kind != 'linear':
+                input = _smallest(parser, family, tried, steps, max_steps, wrapper)
+                rules = _blame(parser, family, tried, steps, wrapper)
+                findings.append(Finding(rule, family_name, kind, degree, tried, steps, input, 
+                                        rules))
+    return findings
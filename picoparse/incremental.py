@@ -0,0 +1,233 @@
+"""Incremental reparsing for picoparse.
+
+IncrementalParser keeps the results of memoised rules from one parse to the next. After 
+an edit, a rule's earlier result is reused if none of the input it looked at (including 
+lookahead) was changed, with its position shifted by the edit, so only rules that 
+overlap the damaged region are run again.
+
+Rules are marked for reuse with memoise. Their results are shared between parses, so 
+they should not contain absolute positions (eg, from pos or span). Memoising the rules 
+for the items of a long list (statements, elements, lines) gives the most reuse; a 
+reparse still visits each item of the list once, to look up its result.
+
+    statement = memoise(statement)
+    doc = IncrementalParser(p(many, statement), text)
+    result, rest = doc.parse()
+    result, rest = doc.edit(120, 3, 'foo')
+"""
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+from picoparse import SequenceWalker, NoMatch, Expectation, EndOfFile, run_walker, local_ps
+
+class IncrementalWalker(SequenceWalker):
+    """A SequenceWalker that records how far into the input it has looked, and holds the 
+    memo table for memoised rules.
+    """
+    def __init__(self, sequence, table):
+        SequenceWalker.__init__(self, sequence)
+        self.table = table
+        self.examined = 0
+    
+    def current(self):
+        if self.index > self.examined:
+            self.examined = self.index
+        return SequenceWalker.current(self)
+    
+    def peek(self):
+        if self.index > self.examined:
+            self.examined = self.index
+        return SequenceWalker.peek(self)
+    
+    def pos(self):
+        if self.index > self.examined:
+            self.examined = self.index
+        return SequenceWalker.pos(self)
+    
+    def lookahead(self, n):
+        if self.index + n > self.examined:
+            self.examined = self.index + n
+        return SequenceWalker.lookahead(self, n)
+    
+    def remaining(self):
+        self.examined = self.len
+        return SequenceWalker.remaining(self)
+
+
+class MemoTable(object):
+    """Results of memoised rules, keyed by rule and start index.
+    
+    Each edit starts a new generation of entries. Entries from older generations are 
+    translated through the edits since they were made when they are looked up, rather 
+    than all being shifted at the time of each edit. Once there are max_generations the 
+    surviving entries are moved into a single generation.
+    
+    An entry is (start, end, examined, result), where examined is the furthest index 
+    the rule looked at. For a failure end is None and result is the token, position 
+    (relative to start) and expectations of the NoMatch.
+    """
+    def __init__(self, max_generations=16):
+        self.max_generations = max_generations
+        self.generations = [{}]
+        self.edits = []
+    
+    def get(self, rule, start):
+        generations = self.generations
+        g = len(generations) - 1
+        p = start
+        while True:
+            entry = generations[g].get((rule, p))
+            if entry is not None:
+                entry = self._forward(entry, g)
+                if entry is not None:
+                    if g != len(generations) - 1:
+                        generations[-1][(rule, start)] = entry
+                    return entry
+            if not g:
+                return None
+            g -= 1
+            p = self._back(p, self.edits[g])
+            if p is None:
+                return None
+    
+    def put(self, rule, entry):
+        self.generations[-1][(rule, entry[0])] = entry
+    
+    def _back(self, p, edit):
+        """Maps index p from after edit to before it, or None if p is in inserted text"""
+        offset, removed, inserted = edit
+        if p < offset:
+            return p
+        if p >= offset + inserted:
+            return p - inserted + removed
+        return None
+    
+    def _forward(self, entry, g):
+        """Moves entry from generation g to the current one, or returns None if an edit 
+        since has changed input the entry depends on.
+        """
+        for offset, removed, inserted in self.edits[g:]:
+            start, end, examined, result = entry
+            if examined < offset:
+                continue
+            if start < offset + removed:
+                return None
+            shift = inserted - removed
+            if end is not None:
+                end += shift
+            entry = start + shift, end, examined + shift, result
+        return entry
+    
+    def edit(self, offset, removed, inserted):
+        """Records the replacement of removed items at offset with inserted items"""
+        self.edits.append((offset, removed, inserted))
+        self.generations.append({})
+        if len(self.generations) > self.max_generations:
+            self.compact()
+    
+    def compact(self):
+        current = {}
+        for g, entries in enumerate(self.generations):
+            for (rule, start), entry in entries.iteritems():
+                entry = self._forward(entry, g)
+                if entry is not None:
+                    current[(rule, entry[0])] = entry
+        self.generations = [current]
+        self.edits = []
+
+
+class memoise(object):
+    """Wraps a rule so that IncrementalParser can reuse its results.
+    
+    Failures are remembered too, unless the rule committed before failing. Outside of 
+    an IncrementalParser the rule is simply run.
+    """
+    def __init__(self, parser):
+        self.parser = parser
+    
+    def __call__(self):
+        walker = local_ps.value
+        table = getattr(walker, 'table', None)
+        if table is None:
+            return self.parser()
+        start = walker.index
+        entry = table.get(self, start)
+        if entry is not None:
+            start, end, examined, result = entry
+            if examined > walker.examined:
+                walker.examined = examined
+            if end is None:
+                token, pos, expecting = result
+                if pos is not EndOfFile:
+                    pos += start
+                raise NoMatch(token, pos, expecting)
+            walker.index = end
+            if not walker.depth:
+                walker._cut()
+            return result
+        outer = walker.examined
+        offset = walker.offset
+        walker.examined = start
+        try:
+            result = self.parser()
+            table.put(self, (start, walker.index, walker.examined, result))
+            return result
+        except NoMatch, e:
+            if walker.offset == offset:
+                pos = e.pos
+                if pos is not EndOfFile:
+                    pos -= start
+                # the expectations are rendered on replay, from a copy that later 
+                # rewrites of e.expecting do not touch
+                failure = NoMatch(e.token, e.pos, e._expecting)
+                failure._failures = e._failures
+                expecting = [Expectation(getattr, failure, 'expecting')]
+                table.put(self, (start, None, walker.examined, (e.token, pos, expecting)))
+            raise
+        finally:
+            if outer > walker.examined:
+                walker.examined = outer
+
+
+class IncrementalParser(object):
+    """Parses a sequence (usually text), and reparses it after each edit, reusing the 
+    results of memoised rules the edit did not affect.
+    """
+    def __init__(self, parser, text, max_generations=16):
+        self.parser = parser
+        self.text = text
+        self.table = MemoTable(max_generations)
+    
+    def parse(self):
+        """Returns the result and remaining input, as run_parser does"""
+        return run_walker(self.parser, IncrementalWalker(self.text, self.table))
+    
+    def edit(self, offset, removed, inserted):
+        """Replaces removed items at offset with inserted, and reparses.
+        """
+        if offset < 0 or removed < 0 or offset + removed > len(self.text):
+            raise ValueError("edit is outside of the text")
+        self.text = self.text[:offset] + inserted + self.text[offset + removed:]
+        self.table.edit(offset, removed, len(inserted))
+        return self.parse()
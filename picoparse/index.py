@@ -0,0 +1,202 @@
+"""Structural indexing for picoparse.
+
+StructuralIndex finds every occurrence of a few structural characters (newlines, angle 
+brackets, quotes and so on) in a string in one sweep before parsing, using NumPy's 
+vectorised comparisons when NumPy is installed and str.find otherwise. Parsers run 
+with run_indexed_parser can then jump straight to the next delimiter with take_until, 
+rather than testing each character in turn, and failures are reported by line and 
+column without counting through the text.
+
+    attribute_value = p(follow, p(cue, quote, p(take_until, '"')), quote)
+    result, rest = run_indexed_parser(document, text, '<>"\\n')
+
+The index is also useful by itself, eg, lines gives the spans of the lines of a log for 
+parsing in parallel.
+"""
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+from bisect import bisect_left
+
+from picoparse import SequenceWalker, SequenceDiagnostics, EndOfFile, run_walker, local_ps
+from picoparse import p as partial
+from picoparse import many, not_one_of
+from picoparse.text import Pos, capture
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+structural_chars = '\n<>"\'[]{}'
+
+# A narrow build indexes unicode strings by UTF-16 code unit, so the code point offsets 
+# the vectorised search finds would not line up with them
+_narrow = sys.maxunicode < 0x10FFFF
+
+class StructuralIndex(object):
+    """The sorted positions of each of chars in sequence.
+    
+    sequence is a str or unicode string (or, without NumPy, anything that can be 
+    indexed). If vectorised is None NumPy is used when it is available. Unicode strings 
+    are never searched with NumPy on a narrow Python build.
+    """
+    def __init__(self, sequence, chars=structural_chars, vectorised=None):
+        if vectorised is None:
+            vectorised = numpy is not None
+        if _narrow and isinstance(sequence, unicode):
+            vectorised = False
+        self.sequence = sequence
+        self.chars = frozenset(chars)
+        if vectorised:
+            self.positions = _positions_vectorised(sequence, self.chars)
+            self.search = numpy.searchsorted
+        else:
+            self.positions = _positions(sequence, self.chars)
+            self.search = bisect_left
+    
+    def find(self, chars, start=0, end=None):
+        """Returns the first position from start (and before end) of any of chars, or None"""
+        if end is None:
+            end = len(self.sequence)
+        found = None
+        for c in chars:
+            try:
+                positions = self.positions[c]
+            except KeyError:
+                raise ValueError(repr(c) + " is not indexed")
+            i = self.search(positions, start)
+            if i < len(positions) and positions[i] < end:
+                if found is None or positions[i] < found:
+                    found = int(positions[i])
+        return found
+    
+    def count(self, c, start=0, end=None):
+        """Returns the number of occurrences of c from start and before end"""
+        positions = self.positions[c]
+        if end is None:
+            end = len(self.sequence)
+        return int(self.search(positions, end) - self.search(positions, start))
+    
+    def lines(self):
+        """Yields the (start, end) span of each line, not including the newline"""
+        start = 0
+        for newline in self.positions['\n']:
+            yield start, int(newline)
+            start = int(newline) + 1
+        if start < len(self.sequence):
+            yield start, len(self.sequence)
+    
+    def location(self, pos):
+        """Returns the row and column (as a text.Pos) of the 1-based position pos"""
+        newlines = self.positions['\n']
+        i = int(self.search(newlines, pos - 1))
+        line_start = i and int(newlines[i - 1]) + 1
+        return Pos(i + 1, pos - line_start)
+    
+    def line(self, row):
+        """Returns the text of the 1-based row, without its newline"""
+        newlines = self.positions['\n']
+        start = row > 1 and int(newlines[row - 2]) + 1 or 0
+        end = row <= len(newlines) and int(newlines[row - 1]) or len(self.sequence)
+        return self.sequence[start:end]
+
+def _positions(sequence, chars):
+    positions = dict((c, []) for c in chars)
+    if hasattr(sequence, 'find'):
+        for c in chars:
+            found = positions[c]
+            i = sequence.find(c)
+            while i >= 0:
+                found.append(i)
+                i = sequence.find(c, i + 1)
+    else:
+        for i, t in enumerate(sequence):
+            if t in positions:
+                positions[t].append(i)
+    return positions
+
+def _positions_vectorised(sequence, chars):
+    if isinstance(sequence, unicode):
+        codes = numpy.frombuffer(sequence.encode('utf-32-le'), dtype='<u4')
+    else:
+        codes = numpy.frombuffer(sequence, dtype=numpy.uint8)
+    return dict((c, numpy.flatnonzero(codes == ord(c))) for c in chars)
+
+
+class IndexedDiagnostics(SequenceDiagnostics):
+    """Reports failures by line and column, found from the newlines in a StructuralIndex.
+    """
+    def __init__(self, sequence, index, context=20):
+        SequenceDiagnostics.__init__(self, sequence, context)
+        self.index = index
+    
+    def generate_error_message(self, noMatch):
+        pos = noMatch.pos
+        if pos is EndOfFile or '\n' not in self.index.chars:
+            return SequenceDiagnostics.generate_error_message(self, noMatch)
+        location = self.index.location(pos)
+        return noMatch.default_message + " (line " + str(location) + ")" \
+               + "\n" + repr(self.index.line(location.row))
+
+
+class IndexedWalker(SequenceWalker):
+    """IndexedWalker walks a string with a StructuralIndex of it, adding take_until to 
+    SequenceWalker.
+    """
+    def __init__(self, sequence, chars=structural_chars, index=None):
+        if index is None:
+            index = StructuralIndex(sequence, chars)
+        SequenceWalker.__init__(self, sequence, IndexedDiagnostics(sequence, index))
+        self.structure = index
+    
+    def take_until(self, chars):
+        """Consumes the tokens before the next of chars (or the end of the input), 
+        returning them as a slice of the input"""
+        start = self.index
+        found = self.structure.find(chars, start, self.len)
+        if found is None:
+            found = self.len
+        self.index = found
+        if not self.depth:
+            self._cut()
+        return self.sequence[start:found]
+
+def take_until(chars):
+    """Consumes input up to, but not including, the next of chars, returning it.
+    
+    With an IndexedWalker (and chars all indexed) this is a jump to the next delimiter; 
+    otherwise it is capture(many(not_one_of(chars))).
+    """
+    walker = local_ps.value
+    if isinstance(walker, IndexedWalker) and walker.structure.chars.issuperset(chars):
+        return walker.take_until(chars)
+    return capture(partial(many, partial(not_one_of, chars)))
+
+def run_indexed_parser(parser, text, chars=structural_chars, lazy=False):
+    """Indexes chars in text, then runs parser over it with an IndexedWalker, returning 
+    the result and the remaining input.
+    """
+    return run_walker(parser, IndexedWalker(text, chars), lazy)
@@ -0,0 +1,248 @@
+"""A table driven lexer for picoparse.
+
+Token rules are declared once and compiled into a DFA transition table. The lexer 
+then splits text into (kind, text, offset) tokens in a single forward pass, taking the 
+longest match at each point and preferring earlier rules on a tie. The tokens can be 
+parsed with the core picoparse combinators, using token to match them:
+
+    lexer = Lexer([skip(run('space', ' \\n')), run('number', '0123456789'), literal('+')])
+    def sum():
+        return sep1(p(token, 'number'), p(token, '+'))
+    run_lexer_parser(sum, lexer, '1 + 2')
+"""
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+from picoparse import NoMatch, SequenceWalker, run_walker, peek, next, fail, EndOfFile
+
+class Rule(object):
+    """A token rule. Use the literal, run, quoted, keywords and skip functions to 
+    create these.
+    """
+    def __init__(self, kind, literal=None, first=None, rest=None, quotes=None, 
+                 escape=None, words=None, within=None):
+        self.kind = kind
+        self.literal = literal
+        self.first = first
+        self.rest = rest
+        self.quotes = quotes
+        self.escape = escape
+        self.words = words
+        self.within = within
+        self.skip = False
+
+def literal(text, kind=None):
+    """Matches text exactly. The token kind defaults to the text itself."""
+    return Rule(kind is None and text or kind, literal=text)
+
+def run(kind, chars, rest=None):
+    """Matches one character from chars followed by any number from rest.
+    
+    rest defaults to chars.
+    """
+    return Rule(kind, first=chars, rest=rest is None and chars or rest)
+
+def quoted(kind, quotes="\"'", escape=None):
+    """Matches a quote character through to the next matching quote.
+    
+    If escape is given, the character following it never closes the quote. The token 
+    text includes the quotes and any escapes.
+    """
+    return Rule(kind, quotes=quotes, escape=escape)
+
+def keywords(words, within, kind='keyword'):
+    """Reclassifies tokens of kind within whose text is one of words as kind."""
+    return Rule(kind, words=frozenset(words), within=within)
+
+def skip(rule):
+    """Matches rule but discards the token, e.g. for whitespace and comments."""
+    rule.skip = True
+    return rule
+
+
+class _NFA(object):
+    """A nondeterministic automaton under construction.
+    
+    Every state has explicit edges on characters, plus optional default edges taken 
+    on any character that the state does not exclude.
+    """
+    def __init__(self):
+        self.edges = []
+        self.defaults = []
+        self.excluded = []
+        self.accepts = {}
+    
+    def state(self):
+        self.edges.append({})
+        self.defaults.append(set())
+        self.excluded.append(frozenset())
+        return len(self.edges) - 1
+    
+    def edge(self, source, chars, target):
+        for c in chars:
+            self.edges[source].setdefault(c, set()).add(target)
+    
+    def default(self, source, excluded, target):
+        self.defaults[source].add(target)
+        self.excluded[source] = frozenset(excluded)
+    
+    def move(self, states, c):
+        targets = set()
+        for s in states:
+            targets.update(self.edges[s].get(c, ()))
+            if c not in self.excluded[s]:
+                targets.update(self.defaults[s])
+        return frozenset(targets)
+
+
+class Lexer(object):
+    """Compiles a list of rules into a transition table and tokenises text with it.
+    """
+    def __init__(self, rules):
+        self.rules = [rule for rule in rules if rule.words is None]
+        self.keywords = {}
+        for rule in rules:
+            if rule.words is not None:
+                for word in rule.words:
+                    self.keywords[(rule.within, word)] = rule.kind
+        self._compile()
+    
+    def _compile(self):
+        nfa = _NFA()
+        starts = []
+        for index, rule in enumerate(self.rules):
+            start = nfa.state()
+            starts.append(start)
+            if rule.literal is not None:
+                state = start
+                for c in rule.literal:
+                    following = nfa.state()
+                    nfa.edge(state, c, following)
+                    state = following
+                nfa.accepts[state] = index
+            elif rule.first is not None:
+                body = nfa.state()
+                nfa.edge(start, rule.first, body)
+                nfa.edge(body, rule.rest, body)
+                nfa.accepts[body] = index
+            else:
+                end = nfa.state()
+                nfa.accepts[end] = index
+                for q in rule.quotes:
+                    body = nfa.state()
+                    nfa.edge(start, q, body)
+                    nfa.edge(body, q, end)
+                    nfa.default(body, q + (rule.escape or ''), body)
+                    if rule.escape:
+                        escaped = nfa.state()
+                        nfa.edge(body, rule.escape, escaped)
+                        nfa.default(escaped, '', body)
+        
+        # subset construction; DFA state 0 is the start state
+        numbers = {}
+        order = []
+        def number(states):
+            if states not in numbers:
+                numbers[states] = len(order)
+                order.append(states)
+            return numbers[states]
+        number(frozenset(starts))
+        
+        self.transitions = []
+        self.defaults = []
+        self.accepts = []
+        i = 0
+        while i < len(order):
+            states = order[i]
+            chars = set()
+            for s in states:
+                chars.update(nfa.edges[s])
+                chars.update(nfa.excluded[s])
+            row = {}
+            for c in chars:
+                targets = nfa.move(states, c)
+                row[c] = None
+                if targets:
+                    row[c] = number(targets)
+            otherwise = frozenset().union(*[nfa.defaults[s] for s in states])
+            accepting = [nfa.accepts[s] for s in states if s in nfa.accepts]
+            self.transitions.append(row)
+            self.defaults.append(None)
+            self.accepts.append(None)
+            if otherwise:
+                self.defaults[i] = number(otherwise)
+            if accepting:
+                self.accepts[i] = min(accepting)
+            i += 1
+        self.expecting = sorted(self.transitions[0])
+    
+    def tokens(self, text):
+        """Generates the (kind, text, offset) tokens of text.
+        
+        Raises NoMatch if some part of text does not match any rule.
+        """
+        transitions = self.transitions
+        defaults = self.defaults
+        accepts = self.accepts
+        rules = self.rules
+        keywords = self.keywords
+        start = 0
+        length = len(text)
+        while start < length:
+            state = 0
+            i = start
+            matched = None
+            while i < length:
+                state = transitions[state].get(text[i], defaults[state])
+                if state is None:
+                    break
+                i += 1
+                if accepts[state] is not None:
+                    matched = accepts[state]
+                    end = i
+            if matched is None:
+                raise NoMatch(text[start], start, self.expecting)
+            rule = rules[matched]
+            if not rule.skip:
+                value = text[start:end]
+                yield (keywords.get((rule.kind, value), rule.kind), value, start)
+            start = end
+
+def token(kind, text=None):
+    """Matches a token of the given kind, and if given, with exactly the given text.
+    
+    Returns the (kind, text, offset) token.
+    """
+    tok = peek()
+    if tok is EndOfFile or tok[0] != kind or (text is not None and tok[1] != text):
+        fail([text is None and kind or text])
+    next()
+    return tok
+
+def run_lexer_parser(parser, lexer, text):
+    """Tokenises text with lexer then runs parser over the tokens.
+    
+    Positions in parse errors are token numbers; each token carries its offset in text.
+    """
+    return run_walker(parser, SequenceWalker(list(lexer.tokens(text))))
@@ -0,0 +1,286 @@
+"""Input sources for picoparse.
+
+ReadAhead reads a file in blocks on a background thread, decoding them as it goes, so 
+that reading and decoding overlap with parsing. Only a few blocks are read ahead of the 
+parser; when they are all waiting to be parsed the thread waits for the parser to catch 
+up, so memory use is bounded whatever the size of the file.
+
+    result, rest = run_text_parser(document, ReadAhead(open('big.xml', 'rb'), 'utf-8'))
+
+Decompressed reads gzip, bz2 and xz streams, decompressing a block at a time, and 
+open_source opens a file with both, choosing the decompression from its extension:
+
+    result, rest = run_text_parser(log, open_source('access.log.gz', 'utf-8'))
+"""
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+import bz2
+import codecs
+import os
+import sys
+import threading
+import zlib
+from Queue import Queue, Full
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+class ReadAhead(object):
+    """An iterable over the contents of file, which is read block_size bytes at a time on 
+    a background thread.
+    
+    If encoding is given the blocks are decoded incrementally, so characters may span 
+    blocks, and the tokens are characters; otherwise they are the bytes of the file. At 
+    most blocks blocks are held waiting to be parsed. Errors from reading or decoding 
+    are raised where the parser reaches them.
+    
+    The thread stops at the end of the file, or when close is called; iterating to the 
+    end, or abandoning the iteration, calls close. With close_file, the thread closes 
+    file when it stops.
+    """
+    def __init__(self, file, encoding=None, block_size=65536, blocks=4, errors='strict', 
+                 close_file=False):
+        self.file = file
+        self.close_file = close_file
+        self.block_size = block_size
+        self.decoder = None
+        if encoding is not None:
+            self.decoder = codecs.getincrementaldecoder(encoding)(errors)
+        self.queue = Queue(blocks)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._read)
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def _read(self):
+        try:
+            while not self.stopped.isSet():
+                data = self.file.read(self.block_size)
+                final = not data
+                if self.decoder is not None:
+                    data = self.decoder.decode(data, final)
+                if data:
+                    self._put(data)
+                if final:
+                    break
+            self._put(None)
+        except Exception:
+            self._put(sys.exc_info())
+        finally:
+            if self.close_file:
+                self.file.close()
+    
+    def _put(self, item):
+        while not self.stopped.isSet():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except Full:
+                pass
+    
+    def __iter__(self):
+        get = self.queue.get
+        try:
+            while True:
+                block = get()
+                if block is None:
+                    return
+                if isinstance(block, tuple):
+                    raise block[0], block[1], block[2]
+                for token in block:
+                    yield token
+        finally:
+            self.close()
+    
+    def close(self):
+        """Stops the reading thread"""
+        self.stopped.set()
+
+
+def _lzma_decompressor():
+    if lzma is None:
+        raise ImportError("reading xz needs the lzma module")
+    return lzma.LZMADecompressor()
+
+decompressors = {
+    'gzip': lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    'bz2': bz2.BZ2Decompressor,
+    'xz': _lzma_decompressor,
+}
+
+magic = [('\x1f\x8b', 'gzip'), ('BZh', 'bz2'), ('\xfd7zXZ\x00', 'xz')]
+
+extensions = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+
+def _finished(decompressor):
+    """Whether decompressor has reached the end of its stream"""
+    eof = getattr(decompressor, 'eof', None)
+    if eof is not None:
+        return eof
+    if hasattr(decompressor, 'unconsumed_tail'):
+        # a finished zlib decompressor leaves anything more it is given in unused_data
+        probe = decompressor.copy()
+        try:
+            probe.decompress('\0')
+        except zlib.error:
+            return False
+        return bool(probe.unused_data)
+    # and a finished bz2 decompressor refuses any more
+    try:
+        decompressor.decompress('')
+    except EOFError:
+        return True
+    return False
+
+class Decompressed(object):
+    """A file-like object for reading the decompressed contents of a gzip, bz2 or xz 
+    stream.
+    
+    format is one of the keys of decompressors; if it is None it is recognised from the 
+    start of the stream. file is read block_size bytes at a time, and the input is 
+    decompressed as it is needed. Streams of several concatenated members are read as 
+    one, and as with the gzip module, zero bytes padding the end of a gzip stream are 
+    ignored. A stream that ends part way through a member raises EOFError.
+    
+    Only gzip output is bounded: it is decompressed at most block_size bytes at a time, 
+    however well the input compresses. The bz2 and xz decompressors cannot limit their 
+    output, so each block of their input is decompressed in full, and highly 
+    compressible input can expand to many times block_size (a single bz2 block can hold 
+    about 45MB).
+    """
+    def __init__(self, file, format=None, block_size=65536):
+        self.file = file
+        self.format = format
+        self.block_size = block_size
+        self.decompressor = None
+        self.input = ''
+        self.pending = ''
+        self.at = 0
+        self.end_of_file = False
+        self.done = False
+    
+    def _start(self, data):
+        while self.format is None and len(data) < 6:
+            more = self.file.read(self.block_size)
+            if not more:
+                break
+            data += more
+        if self.format is None:
+            for prefix, format in magic:
+                if data.startswith(prefix):
+                    self.format = format
+                    break
+            else:
+                raise ValueError("unrecognised compressed stream")
+        self.decompressor = decompressors[self.format]()
+        return data
+    
+    def _next_member(self, data):
+        """Starts a new decompressor for the member at the start of data"""
+        if self.format == 'gzip':
+            data = data.lstrip('\0')
+        self.input = data
+        if data:
+            self.decompressor = decompressors[self.format]()
+    
+    def _decompress(self):
+        """Decompresses some of input, starting a new decompressor at the end of each 
+        member"""
+        decompressor = self.decompressor
+        try:
+            if hasattr(decompressor, 'unconsumed_tail'):
+                out = decompressor.decompress(self.input, self.block_size)
+                self.input = decompressor.unconsumed_tail
+            else:
+                out = decompressor.decompress(self.input)
+                self.input = ''
+        except EOFError:
+            # a finished bz2 or xz decompressor refuses more input rather than leaving it 
+            # in unused_data, as happens when a member ends exactly at the end of a block
+            self._next_member(self.input)
+            return ''
+        if decompressor.unused_data:
+            self._next_member(decompressor.unused_data)
+        return out
+    
+    def _finish(self):
+        """Returns the last of the output once the input has run out, checking that the 
+        last member was complete"""
+        decompressor = self.decompressor
+        if hasattr(decompressor, 'unconsumed_tail'):
+            out = decompressor.decompress('', self.block_size)
+            if out:
+                return out
+        if not _finished(decompressor):
+            raise EOFError("Compressed file ended before the end-of-stream marker was "
+                           "reached")
+        return ''
+    
+    def read(self, size=-1):
+        while self.at >= len(self.pending):
+            if self.done:
+                return ''
+            if not self.input and not self.end_of_file:
+                data = self.file.read(self.block_size)
+                if self.decompressor is None:
+                    if not data:
+                        return ''
+                    data = self._start(data)
+                self.input = data
+                self.end_of_file = not data
+            if self.input:
+                self.pending = self._decompress()
+            else:
+                self.pending = self._finish()
+                self.done = not self.pending
+            self.at = 0
+        if size < 0:
+            size = len(self.pending)
+        start = self.at
+        self.at = min(start + size, len(self.pending))
+        return self.pending[start:self.at]
+    
+    def close(self):
+        self.file.close()
+
+def open_source(path, encoding=None, format=None, block_size=65536, blocks=4, 
+                errors='strict'):
+    """Opens the file at path as a ReadAhead source, decompressing it if it is 
+    compressed.
+    
+    Unless format is given (see Decompressed) it is chosen from the extension of path; 
+    files with other extensions are read as they are.
+    """
+    file = open(path, 'rb')
+    if format is None:
+        format = extensions.get(os.path.splitext(path)[1].lower())
+    if format is not None:
+        file = Decompressed(file, format, block_size)
+    return ReadAhead(file, encoding, block_size, blocks, errors, close_file=True)
@@ -27,11 +27,15 @@ for instance the quote and quoted parsers assume quotes can be ' or "
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
 # POSSIBILITY OF SUCH DAMAGE.
 
-from string import whitespace as _whitespace_chars
+from string import whitespace as _whitespace_chars, hexdigits as _hexdigits
+from collections import deque
+from bisect import bisect_right
 
 from picoparse import p as partial
 from picoparse import string, one_of, many, many1, many_until, any_token, run_parser
-from picoparse import NoMatch, fail, tri, EndOfFile, optional, compose
+from picoparse import NoMatch, fail, tri, EndOfFile, optional, compose, validate
+from picoparse import peek, next, choice, sep1, eof
+from picoparse import capture as _capture
 
 def build_string(iterable):
     """A utility function to wrap up the converting a list of characters back into a string.
@@ -40,6 +44,15 @@ def build_string(iterable):
 
 as_string = partial(compose, build_string)
 
+def capture(parser):
+    """Runs parser, returning the text it consumed rather than its result.
+    
+    When parsing a string this is a slice of it, so no list of characters is built.
+    """
+    text = _capture(parser)
+    if isinstance(text, basestring):
+        return text
+    return build_string(text)
 
 
 quote = partial(one_of, "\"'")
@@ -88,6 +101,100 @@ def caseless_literal(s):
     return make_caseless_literal(s)()
 
 
+def _code(c):
+    if isinstance(c, (int, long)):
+        return c
+    return ord(c)
+
+class CharClass(object):
+    """A set of characters given as inclusive (low, high) ranges of characters or code 
+    points; eg, CharClass([('a', 'z'), ('0', '9'), (0xC0, 0xD6)]).
+    
+    Membership (c in char_class) is a table lookup for ASCII characters, and otherwise 
+    a single bisect of the merged ranges. A CharClass is also a parser that accepts one 
+    character in the class, and classes can be combined with |.
+    """
+    def __init__(self, ranges, description=None):
+        merged = []
+        for low, high in sorted((_code(low), _code(high)) for low, high in ranges):
+            if merged and low <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], high)
+            else:
+                merged.append([low, high])
+        self.ranges = [tuple(r) for r in merged]
+        self.lows = [low for low, high in merged]
+        self.highs = [high for low, high in merged]
+        self.ascii = [False] * 128
+        for low, high in merged:
+            for i in range(low, min(high + 1, 128)):
+                self.ascii[i] = True
+        self.description = description
+    
+    def __contains__(self, c):
+        try:
+            o = ord(c)
+        except TypeError:
+            return False
+        if o < 128:
+            return self.ascii[o]
+        i = bisect_right(self.lows, o) - 1
+        return i >= 0 and o <= self.highs[i]
+    
+    def __call__(self):
+        ch = peek()
+        if ch is EndOfFile or ch not in self:
+            fail([self])
+        next()
+        return ch
+    
+    def __or__(self, other):
+        return CharClass(self.ranges + other.ranges)
+    
+    def __repr__(self):
+        if self.description is not None:
+            return self.description
+        return ' | '.join(low == high and '#x%X' % low or '[#x%X-#x%X]' % (low, high)
+                          for low, high in self.ranges)
+
+def char_class(ranges):
+    """Returns a CharClass parser accepting a character in any of the (low, high) ranges"""
+    return CharClass(ranges)
+
+# The character class notation used by the XML spec; see char_spec
+def _spec_hex():
+    string('#x')
+    return int(build_string(many1(partial(one_of, _hexdigits))), 16)
+
+_spec_char = partial(choice, _spec_hex, compose(ord, any_token))
+
+def _spec_range():
+    one_of('[')
+    low = _spec_char()
+    one_of('-')
+    high = _spec_char()
+    one_of(']')
+    return low, high
+
+def _spec_single():
+    c = choice(_spec_hex, compose(ord, quoted))
+    return c, c
+
+def _spec():
+    ranges = sep1(partial(choice, _spec_range, _spec_single), partial(lexeme, partial(one_of, '|')))
+    eof()
+    return ranges
+
+def char_spec(spec):
+    """Returns a CharClass from a spec in the notation the XML spec uses for character 
+    classes; ranges and single characters separated by |, eg:
+    
+        char_spec('":" | [A-Z] | "_" | [a-z] | #xB7 | [#xC0-#xD6]')
+    """
+    spec = spec.strip()
+    ranges, _ = run_text_parser(_spec, spec)
+    return CharClass(ranges, spec)
+
+
 class Pos(object):
     def __init__(self, row, col):
         self.row = row
@@ -98,52 +205,69 @@ class Pos(object):
 
 
 class TextDiagnostics(object):
-    def __init__(self):
-        self.lines = []
+    """Positions characters by row and column and reports the lines around a failure.
+    
+    Characters are passed on as they are read, and only the most recent lines are kept, 
+    enough to show context lines either side of the failing line, so storage does not 
+    grow with the uncommitted input. Of each line only the first line_limit characters 
+    are kept.
+    """
+    def __init__(self, context=3, line_limit=1000):
+        self.context = context
+        self.line_limit = line_limit
+        self.lines = deque(maxlen=2 * context + 1)
         self.row = 1
         self.col = 1
         self.line = []
 
     def generate_error_message(self, noMatch):
         return noMatch.default_message \
-               + "\n" + "\n".join(self.lines)
+               + "\n" + "\n".join(self.window(noMatch.pos))
+
+    def window(self, pos):
+        """Returns the retained lines within context rows of pos"""
+        lines = list(self.lines)
+        last_row = self.row - 1
+        if self.line:
+            lines.append(u''.join(self.line))
+            last_row += 1
+        if pos is EndOfFile:
+            return lines[-self.context:]
+        first_row = last_row - len(lines) + 1
+        low = max(pos.row - self.context - first_row, 0)
+        high = max(pos.row + self.context + 1 - first_row, 0)
+        return lines[low:high]
 
     def cut(self, p):
         if p == EndOfFile:
-            self.lines = []
+            self.lines.clear()
         else:
-            # 1   |  num rows = 5
+            # 1   |  row = 6, the current line
             # 2 | |
-            # 3 | |_ cut (3 rows) (2 discarded from buffer)
-            # 4 |                  2 = 3 - (5 - 4)
-            # 5 |_ buffer (4 rows)
-            buffer_rows = len(self.lines)
-            num_rows = self.row - 1
-            cut_rows = p.row - 1
-            discard_rows = cut_rows - (num_rows - buffer_rows)
-            self.lines = self.lines[discard_rows:]
+            # 3 | |_ cut at row 3 (1 discarded from buffer)
+            # 4 |                  1 = 3 - (6 - 4)
+            # 5 |_ buffer (4 complete rows)
+            first_row = self.row - len(self.lines)
+            for i in range(min(p.row - first_row, len(self.lines))):
+                self.lines.popleft()
 
     def wrap(self, stream):
-        try:
-            while True:
-                ch = stream.next()
+        for ch in stream:
+            pos = Pos(self.row, self.col)
+            if len(self.line) < self.line_limit:
                 self.line.append(ch)
-                if ch == '\n':
-                    for tok in self.emit_line():
-                        yield tok
-        except StopIteration:
-            for tok in self.emit_line():
-                yield tok
-
-    def emit_line(self):
-        self.lines.append(u''.join(self.line))
-        for ch in self.line:
-            yield (ch, Pos(self.row, self.col))
-            self.col += 4 if ch == '\t' else 1
-        self.row += 1
-        self.col = 1
-        self.line = []
+            if ch == '\n':
+                self.lines.append(u''.join(self.line))
+                self.line = []
+                self.row += 1
+                self.col = 1
+            else:
+                self.col += 4 if ch == '\t' else 1
+            yield ch, pos
+
+def run_text_parser(parser, input, **kwargs):
+    return run_parser(parser, input, TextDiagnostics(), **kwargs)
 
-def run_text_parser(parser, input):
-    return run_parser(parser, input, TextDiagnostics())
+def validate_text(parser, input, **kwargs):
+    return validate(parser, input, TextDiagnostics(), **kwargs)
 
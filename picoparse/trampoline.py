@@ -0,0 +1,197 @@
+"""Trampolined execution for deeply nested grammars.
+
+Ordinary picoparse parsers recurse through Python calls, so nesting in the input is 
+limited by the recursion limit. Grammars written as generators instead are run by 
+trampoline on a stack of generators held in a list, and can nest as deeply as memory 
+allows.
+
+In a generator grammar:
+ - yielding a parser calls it, and the yield evaluates to its result. If the parser 
+   is itself a generator grammar it is pushed onto the stack rather than recursed into.
+ - yielding anything else returns it as the result of the grammar; use result to 
+   return a callable.
+ - NoMatch raised by a parser is raised at the yield that called it.
+ - a grammar that runs off its end returns None.
+
+For example:
+
+    def parened():
+        one_of('(')
+        v = yield expression
+        one_of(')')
+        yield ['paren', v]
+
+Parsers that do not call back into generator grammars, such as one_of here, can simply 
+be called; yielding the token one_of returns would return it from parened instead. The combinators here (choice, many, tri...) are the 
+generator versions of those in picoparse, and must be used in place of them for any 
+parser that yields. Wrap the top of the grammar in trampoline to run it like any 
+other parser.
+"""
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+from types import GeneratorType
+
+from picoparse import NoMatch, Parser, partial, local_ps
+
+class result(object):
+    """Wraps a value for a generator grammar to yield as its result.
+    
+    Only needed when the result is callable, and so would otherwise be called.
+    """
+    __slots__ = ('value',)
+    
+    def __init__(self, value):
+        self.value = value
+
+def _trampoline(parser):
+    value = parser()
+    if not isinstance(value, GeneratorType):
+        return value
+    stack = [value]
+    value = None
+    error = None
+    while stack:
+        gen = stack[-1]
+        try:
+            if error is None:
+                out = gen.send(value)
+            else:
+                out = gen.throw(*error)
+                error = None
+        except StopIteration:
+            stack.pop()
+            value = None
+            continue
+        except NoMatch:
+            stack.pop()
+            error = sys.exc_info()
+            continue
+        if isinstance(out, result):
+            stack.pop()
+            value = out.value
+        elif callable(out):
+            try:
+                value = out()
+            except NoMatch:
+                error = sys.exc_info()
+                continue
+            if isinstance(value, GeneratorType):
+                stack.append(value)
+                value = None
+        else:
+            stack.pop()
+            value = out
+    if error is not None:
+        raise error[0], error[1], error[2]
+    return value
+
+def trampoline(parser):
+    """Returns a parser that runs the generator grammar parser on an explicit stack.
+    """
+    return Parser(_trampoline, parser)
+
+################################################################
+# Generator versions of the core combinators
+
+def choice(*parsers):
+    """Tries each parser in turn, as picoparse.choice does."""
+    if not parsers:
+        return
+    walker = local_ps.value
+    point = walker.choice_point()
+    for parser in parsers:
+        try:
+            value = yield parser
+        except NoMatch, e:
+            if not walker.backtrack(point, e):
+                break
+        else:
+            yield result(value)
+    raise NoMatch.join(point[3])
+
+def optional(parser, default=None):
+    """Tries to apply the provided parser, returning default if the parser fails.
+    """
+    return choice(parser, lambda: default)
+
+def tri(parser):
+    """The generator version of picoparse.tri"""
+    return Parser(_tri, parser)
+
+def _tri(parser, *args, **kwargs):
+    walker = local_ps.value
+    old_depth = walker.enter_tri()
+    value = yield partial(parser, *args, **kwargs)
+    walker.leave_tri(old_depth)
+    yield result(value)
+
+def many(parser):
+    """Applies the parser to input zero or more times, returning a list of the results.
+    """
+    results = []
+    terminate = object()
+    walker = local_ps.value
+    while walker:
+        value = yield partial(optional, parser, terminate)
+        if value is terminate:
+            break
+        results.append(value)
+    yield results
+
+def many1(parser):
+    """Like many, but must consume at least one of parser"""
+    first = yield parser
+    rest = yield partial(many, parser)
+    yield [first] + rest
+
+def cue(*parsers):
+    """Runs multiple parsers and returns the result of the last."""
+    value = None
+    for parser in parsers:
+        value = yield parser
+    yield result(value)
+
+def follow(*parsers):
+    """Runs multiple parsers and returns the result of the first."""
+    if not parsers:
+        return
+    value = yield parsers[0]
+    for parser in parsers[1:]:
+        yield parser
+    yield result(value)
+
+def described(name, parser, *args, **kwargs):
+    """The generator version of picoparse.p(name, parser, ...); failures at the starting 
+    position are reported as expecting name.
+    """
+    cur_pos = local_ps.value.pos()
+    try:
+        value = yield partial(parser, *args, **kwargs)
+    except NoMatch, e:
+        if e.pos == cur_pos:
+            e.expecting = [name]
+        raise
+    yield result(value)
@@ -26,6 +26,15 @@
 from backend import *
 from core_parsers import *
 from text_parsers import *
+from grammar_analysis import *
+from binary_parsers import *
+from lexer_parsers import *
+from artifact_cache import *
+from trampoline_parsers import *
+from incremental_parsers import *
+from complexity_analysis import *
+from input_sources import *
+from structural_index import *
 import unittest
 
 if __name__ == '__main__':
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+if __name__ == '__main__':
+    import sys
+    from os import path
+    sys.path.insert(0, path.abspath(path.join(path.dirname(sys.argv[0]), '..')))
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import picoparse
+from picoparse.cache import artifact
+
+builds = []
+
+@artifact
+def build_table(name):
+    builds.append(name)
+    return {'name': name, 'ranges': [(u'a', u'z')]}
+
+@artifact
+def build_unpicklable(name):
+    builds.append(name)
+    return lambda: name
+
+class TestArtifact(unittest.TestCase):
+    def setUp(self):
+        self.old = os.environ.get('PICOPARSE_CACHE')
+        self.dir = tempfile.mkdtemp()
+        os.environ['PICOPARSE_CACHE'] = self.dir
+        del builds[:]
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        if self.old is None:
+            del os.environ['PICOPARSE_CACHE']
+        else:
+            os.environ['PICOPARSE_CACHE'] = self.old
+    
+    def testcached(self):
+        first = build_table('x')
+        second = build_table('x')
+        self.assertEquals(first, second)
+        self.assertEquals(builds, ['x'])
+        self.assertEquals(len(os.listdir(self.dir)), 1)
+    
+    def testkeyed_by_args(self):
+        self.assertEquals(build_table('x')['name'], 'x')
+        self.assertEquals(build_table('y')['name'], 'y')
+        self.assertEquals(builds, ['x', 'y'])
+    
+    def testcorrupt(self):
+        build_table('x')
+        for name in os.listdir(self.dir):
+            open(os.path.join(self.dir, name), 'wb').write('not a pickle')
+        self.assertEquals(build_table('x')['name'], 'x')
+        self.assertEquals(builds, ['x', 'x'])
+    
+    def testunpicklable(self):
+        self.assertEquals(build_unpicklable('x')(), 'x')
+        self.assertEquals(build_unpicklable('x')(), 'x')
+        self.assertEquals(builds, ['x', 'x'])
+        self.assertEquals(os.listdir(self.dir), [])
+    
+    def testversioned(self):
+        build_table('x')
+        build_table('y')
+        old_version = picoparse.__version__
+        picoparse.__version__ = old_version + '.upgraded'
+        try:
+            build_table('x')
+        finally:
+            picoparse.__version__ = old_version
+        self.assertEquals(builds, ['x', 'y', 'x'])
+        self.assertEquals(len(os.listdir(self.dir)), 2)
+    
+    def testdisabled(self):
+        os.environ['PICOPARSE_CACHE'] = ''
+        build_table('x')
+        build_table('x')
+        self.assertEquals(builds, ['x', 'x'])
+        self.assertEquals(os.listdir(self.dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+__all__ = [cls.__name__ for name, cls in locals().items()
+                        if isinstance(cls, type) 
+                        and name.startswith('Test')]
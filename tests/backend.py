@@ -30,7 +30,9 @@ if __name__ == '__main__':
 
 import unittest
 
-from picoparse import NoMatch, DefaultDiagnostics, BufferWalker
+from picoparse import NoMatch, DefaultDiagnostics, BufferWalker, LookaheadExceeded, EndOfFile
+from picoparse import BudgetExceeded, local_ps
+from picoparse import run_parser, tri, many, one_of, choice, cue
 from picoparse import partial as p
 from itertools import count, izip
 
@@ -61,6 +63,19 @@ class TestDefaultDiagnostics(unittest.TestCase):
         c, p = self.i.next()
         self.diag.cut(p)
         self.assertEquals(self.diag.tokens, [(3,3)])
+    
+    def test_bounded(self):
+        diag = DefaultDiagnostics(context=2)
+        for r in diag.wrap(xrange(1, 100)):
+            self.assert_(len(diag.tokens) <= 5)
+        self.assertEquals(diag.tokens, zip(range(95, 100), range(95, 100)))
+    
+    def test_window(self):
+        diag = DefaultDiagnostics(context=2)
+        list(diag.wrap(xrange(1, 100)))
+        self.assertEquals(diag.window(97), zip(range(95, 100), range(95, 100)))
+        self.assertEquals(diag.window(99), [(97, 97), (98, 98), (99, 99)])
+        self.assertEquals(diag.window(EndOfFile), [(98, 98), (99, 99)])
 
 
 class TestBufferWalker(unittest.TestCase):
@@ -145,6 +160,124 @@ class TestBufferWalker(unittest.TestCase):
         self.assertRaises(NoMatch, p(self.bw.choice, fun))
         self.assertEquals(self.bw.peek(), 'b')
 
+
+class TestLookaheadLimit(unittest.TestCase):
+    """Checks that max_lookahead bounds the uncommitted buffer
+    """
+    def setUp(self):
+        self.bw = BufferWalker("abcdefghi", None, 3)
+    
+    def test_within_limit(self):
+        def fun():
+            self.bw.next()
+            self.bw.next()
+        self.bw.tri(fun)
+        self.assertEquals(self.bw.peek(), 'c')
+    
+    def test_exceeded(self):
+        def fun():
+            for i in range(5):
+                self.bw.next()
+        self.assertRaises(LookaheadExceeded, p(self.bw.tri, fun))
+    
+    def test_commit_resets(self):
+        def fun():
+            for i in range(5):
+                self.bw.next()
+                self.bw.commit()
+        self.bw.tri(fun)
+        self.assertEquals(self.bw.peek(), 'f')
+    
+    def test_not_caught_by_choice(self):
+        def fun():
+            for i in range(5):
+                self.bw.next()
+        self.assertRaises(LookaheadExceeded, p(self.bw.choice, p(self.bw.tri, fun), self.bw.next))
+    
+    def test_run_parser(self):
+        many_as = tri(p(many, p(one_of, 'a')))
+        self.assertEquals(run_parser(many_as, 'aaab', max_lookahead=10), (['a'] * 3, ['b']))
+        try:
+            run_parser(many_as, 'a' * 20, max_lookahead=10)
+        except LookaheadExceeded, e:
+            self.assertEquals(e.limit, 10)
+            self.assertEquals(e.start, 1)
+            self.assert_('test_run_parser' in e.location)
+        else:
+            self.fail("expected LookaheadExceeded")
+
+def backtracking():
+    """Takes time exponential in the nesting of '(x)b'"""
+    return choice(tri(p(cue, p(one_of, '('), backtracking, p(one_of, ')'), p(one_of, 'a'))),
+                  tri(p(cue, p(one_of, '('), backtracking, p(one_of, ')'), p(one_of, 'b'))),
+                  p(one_of, 'x'))
+
+def nested(n):
+    return '(' * n + 'x' + ')b' * n
+
+class TestBudget(unittest.TestCase):
+    """Checks that max_steps and deadline bound the work a parse does
+    """
+    def test_counts(self):
+        bw = BufferWalker("(x)b")
+        budget = bw.set_budget()
+        bw.choice(p(bw.tri, p(bw.next)), bw.next)
+        self.assertEquals((budget.reads, budget.choices, budget.rewinds), (1, 1, 0))
+        self.assertEquals(budget.steps, 2)
+        self.assertEquals(bw.budget, budget)
+    
+    def test_within_budget(self):
+        self.assertEquals(run_parser(backtracking, nested(3), max_steps=1000), ('b', []))
+    
+    def test_max_steps(self):
+        try:
+            run_parser(backtracking, nested(20), max_steps=10000)
+        except BudgetExceeded, e:
+            self.assertEquals(e.steps, 10001)
+            self.assert_('backtracking' in e.location)
+        else:
+            self.fail("expected BudgetExceeded")
+    
+    def test_deadline(self):
+        self.assertRaises(BudgetExceeded, run_parser, backtracking, nested(20), deadline=0)
+    
+    def test_not_caught_by_choice(self):
+        self.assertRaises(BudgetExceeded, run_parser, 
+                          p(choice, p(many, p(one_of, 'a')), p(one_of, 'b')), 'a' * 10, max_steps=5)
+
+def switching(tokens, other):
+    """Yields tokens, leaving another walker current on every pull as though the parse 
+    had been suspended and another resumed"""
+    for token in tokens:
+        local_ps.value = other
+        yield token
+
+class TestInterleaving(unittest.TestCase):
+    """Checks that a parse resumes with its own walker after pulling from its source
+    """
+    def test_restored_after_pull(self):
+        other = BufferWalker("zzz")
+        self.assertEquals(run_parser(p(many, p(one_of, 'a')), switching('aaab', other)), 
+                          (['a'] * 3, ['b']))
+    
+    def test_interleaved_parses(self):
+        as_ = p(many, p(one_of, 'a'))
+        bs = p(many, p(one_of, 'b'))
+        def source():
+            for token in 'aa':
+                yield token
+            results.append(run_parser(bs, 'bbc'))
+            yield 'a'
+        results = []
+        self.assertEquals(run_parser(as_, source()), (['a'] * 3, []))
+        self.assertEquals(results, [(['b'] * 2, ['c'])])
+    
+    def test_outside_parse(self):
+        bw = BufferWalker(switching('ab', None))
+        local_ps.value = bw
+        bw.next()
+        self.assertEquals(local_ps.value, bw)
+
 if __name__ == '__main__':
     unittest.main()
 
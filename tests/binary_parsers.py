@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+if __name__ == '__main__':
+    import sys
+    from os import path
+    sys.path.insert(0, path.abspath(path.join(path.dirname(sys.argv[0]), '..')))
+
+import unittest
+from struct import pack
+
+import core_parsers
+from picoparse import partial as p
+from picoparse import run_walker, SequenceWalker, NoMatch, one_of, many, choice, tri, cue
+from picoparse.binary import run_binary_parser, take, unpack, length_prefixed, bytes_until
+from picoparse.binary import u8, i8, u16, u16le, u32, i32, i32le, u64le, BinaryWalker
+
+def run_sequence_parser(parser, input):
+    return run_walker(parser, SequenceWalker(input))
+
+class TestSequenceTokenConsumers(core_parsers.TestTokenConsumers):
+    def run_parser(self, *args):
+        return run_sequence_parser(*args)
+
+class TestSequenceManyCombinators(core_parsers.TestManyCombinators):
+    def run_parser(self, *args):
+        return run_sequence_parser(*args)
+
+class TestSequenceSeparatorCombinators(core_parsers.TestSeparatorCombinators):
+    def run_parser(self, *args):
+        return run_sequence_parser(*args)
+
+class TestSequenceSequencingCombinators(core_parsers.TestSequencingCombinators):
+    def run_parser(self, *args):
+        return run_sequence_parser(*args)
+
+class TestSequenceFuture(core_parsers.TestFuture):
+    def run_parser(self, *args):
+        return run_sequence_parser(*args)
+
+class TestSequenceKeywordSet(core_parsers.TestKeywordSet):
+    def run_parser(self, *args):
+        return run_sequence_parser(*args)
+
+
+class BinaryParserTestCase(unittest.TestCase):
+    def assertMatch(self, parser, input, expected, remaining):
+        result, rest = run_binary_parser(parser, input)
+        if isinstance(result, memoryview):
+            result = result.tobytes()
+        self.assertEquals((result, rest.tobytes()), (expected, remaining))
+    
+    def assertNoMatch(self, parser, input):
+        self.assertRaises(NoMatch, run_binary_parser, parser, input)
+
+
+class TestBinaryParsers(BinaryParserTestCase):
+    def testtake(self):
+        self.assertMatch(p(take, 3), 'abcd', 'abc', 'd')
+        self.assertMatch(p(take, 0), 'abcd', '', 'abcd')
+        self.assertNoMatch(p(take, 5), 'abcd')
+        self.assertMatch(p(take, 2), bytearray('ab'), 'ab', '')
+        self.assertMatch(p(take, 2), memoryview('abc'), 'ab', 'c')
+    
+    def testtake_is_a_view(self):
+        data = bytearray('abcd')
+        result, rest = run_binary_parser(p(take, 2), data)
+        data[0] = 'z'
+        self.assertEquals(result.tobytes(), 'zb')
+    
+    def testintegers(self):
+        self.assertMatch(u8, '\xff', 255, '')
+        self.assertMatch(i8, '\xff', -1, '')
+        self.assertMatch(u16, '\x01\x02', 0x0102, '')
+        self.assertMatch(u16le, '\x01\x02', 0x0201, '')
+        self.assertMatch(u32, pack('>I', 123456789) + 'x', 123456789, 'x')
+        self.assertMatch(i32, pack('>i', -5), -5, '')
+        self.assertMatch(i32le, pack('<i', -5), -5, '')
+        self.assertMatch(u64le, pack('<Q', 2 ** 40), 2 ** 40, '')
+        self.assertNoMatch(u16, '\x01')
+        self.assertNoMatch(u32, '\x01\x02\x03')
+    
+    def testunpack(self):
+        self.assertMatch(p(unpack, '>HB'), '\x00\x01\x02', (1, 2), '')
+        self.assertNoMatch(p(unpack, '>HB'), '\x00\x01')
+    
+    def testlength_prefixed(self):
+        block = p(length_prefixed, p(many, p(one_of, 'ab')), u8)
+        self.assertMatch(block, '\x03abaz', ['a', 'b', 'a'], 'z')
+        self.assertMatch(block, '\x00z', [], 'z')
+        self.assertNoMatch(block, '\x03abza')
+        self.assertNoMatch(block, '\x04aba')
+        self.assertMatch(p(length_prefixed, p(take, 2)), '\x00\x00\x00\x02abc', 'ab', 'c')
+    
+    def testbytes_until(self):
+        self.assertMatch(p(bytes_until, '\r\n'), 'abc\r\ndef', 'abc', 'def')
+        self.assertMatch(p(bytes_until, '\r\n'), '\r\n', '', '')
+        self.assertNoMatch(p(bytes_until, '\r\n'), 'abc\r')
+        self.assertNoMatch(p(length_prefixed, p(bytes_until, '!'), u8), '\x02ab!')
+    
+    def testmemoryview_not_copied(self):
+        data = bytearray('ab\r\ncdefgh\r\nij')
+        walker = BinaryWalker(memoryview(data))
+        walker.chunk_size = 3
+        lines = p(many, tri(p(bytes_until, '\r\n')))
+        result, rest = run_walker(lines, walker)
+        self.assertEquals(walker.data, None)
+        self.assertEquals(([r.tobytes() for r in result], rest.tobytes()), 
+                          (['ab', 'cdefgh'], 'ij'))
+        data[0] = 'z'
+        self.assertEquals(result[0].tobytes(), 'zb')
+        self.assertMatch(p(unpack, '>H'), memoryview(bytearray('\x00\x01')), (1,), '')
+        self.assertNoMatch(p(bytes_until, '!!'), memoryview('a!b!c'))
+    
+    def testbacktracking(self):
+        frame = p(choice, tri(p(cue, p(one_of, '\x01'), u16)), 
+                          p(cue, p(one_of, '\x01'), u8))
+        self.assertMatch(frame, '\x01\x00\x05', 5, '')
+        self.assertMatch(frame, '\x01\x05', 5, '')
+        self.assertNoMatch(frame, '\x02\x05')
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+__all__ = [cls.__name__ for name, cls in locals().items()
+                        if isinstance(cls, type) 
+                        and name.startswith('Test')]
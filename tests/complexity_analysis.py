@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+if __name__ == '__main__':
+    import sys
+    from os import path
+    sys.path.insert(0, path.abspath(path.join(path.dirname(sys.argv[0]), '..')))
+
+import unittest
+
+from picoparse import partial as p
+from picoparse import choice, tri, cue, one_of, many, many1
+from picoparse.text import TextDiagnostics
+from picoparse.complexity import analyse, families, measure, growth, nested, near_miss
+from picoparse.complexity import attribute
+
+from backend import backtracking
+
+one_a = p(one_of, 'a')
+# at each 'a' the first choice reads every remaining 'a' before failing
+quadratic = p(many1, p(choice, tri(p(cue, p(many, one_a), p(one_of, 'b'))), one_a))
+linear = p(many, one_a)
+
+def scan_for_b():
+    many(one_a)
+    one_of('b')
+
+def item():
+    return choice(tri(scan_for_b), one_a)
+
+def document():
+    return many1(item)
+
+class TestComplexity(unittest.TestCase):
+    def testmeasure(self):
+        self.assertEquals(measure(linear, 'aaab'), 4)
+        self.assertEquals(measure(one_a, 'b'), 0)
+        self.assertEquals(measure(linear, 'a' * 100, max_steps=50), None)
+    
+    def testgrowth(self):
+        self.assertEquals(growth((4, 8, 16), (10, 20, 40))[0], 'linear')
+        self.assertEquals(growth((4, 8, 16), (16, 64, 256)), ('polynomial', 2.0))
+        self.assertEquals(growth((4, 8, 16), (16, 256, 65536))[0], 'exponential')
+        self.assertEquals(growth((4, 8), (16, None)), ('exponential', None))
+        self.assertEquals(growth((4, 8, 16), (0, 0, 0))[0], 'linear')
+        self.assertEquals(analyse([('a', one_a, families('b'))]), [])
+    
+    def testfamilies(self):
+        self.assertEquals(nested('(', 'x', ')')(2), '((x))')
+        self.assertEquals(near_miss('ab', 'c')(2), 'ababac')
+        self.assertEquals([name for name, f in families('a', open='(', close=')')], 
+                          ['repeated', 'near miss', 'nested'])
+    
+    def testanalyse(self):
+        probes = [('backtracking', backtracking, families('x', open='(', close=')b')),
+                  ('quadratic', quadratic, families('a', bad='c')),
+                  ('linear', linear, families('a', bad='c'))]
+        findings = analyse(probes, sizes=(4, 8, 16, 32), max_steps=20000, 
+                           wrapper=TextDiagnostics)
+        self.assertEquals([(f.rule, f.family, f.kind) for f in findings],
+                          [('backtracking', 'nested', 'exponential'),
+                           ('quadratic', 'repeated', 'polynomial'),
+                           ('quadratic', 'near miss', 'polynomial')])
+        self.assertEquals(findings[0].steps[-1], None)
+        self.assertEquals(findings[0].input, '((((((x)b)b)b)b)b)b')
+        self.assert_(len(findings[1].input) < 32)
+        self.assert_('quadratic is polynomial' in str(findings[1]))
+    
+    def testattribute(self):
+        counts = attribute(document, 'aaaa')
+        rules = dict((rule and rule.split()[0], n) for rule, n in counts.items())
+        self.assertEquals(rules, {'item': 8, 'scan_for_b': 10})
+        self.assertEquals(attribute(linear, 'aa'), {None: 2})
+        self.assertEquals(attribute(linear, 'a' * 10, max_steps=5), None)
+    
+    def testoffender(self):
+        findings = analyse([('document', document, families('a', bad='c'))], 
+                           sizes=(4, 8, 16))
+        self.assertEquals(findings[0].family, 'repeated')
+        self.assert_(findings[0].offender.startswith('scan_for_b at '))
+        self.assert_('mostly in scan_for_b' in str(findings[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+__all__ = [cls.__name__ for name, cls in locals().items()
+                        if isinstance(cls, type) 
+                        and name.startswith('Test')]
@@ -29,14 +29,22 @@ if __name__ == '__main__':
     sys.path.insert(0, path.abspath(path.join(path.dirname(sys.argv[0]), '..')))
 
 import unittest
+from collections import deque
+
+import picoparse
 
 from picoparse import partial as p
 from picoparse import run_parser as run, NoMatch
-from picoparse import any_token, one_of, not_one_of, satisfies, eof
+from picoparse import any_token, one_of, not_one_of, satisfies, satisfies_cached, eof
 from picoparse import many, many1, many_until, many_until1, n_of, optional
 from picoparse import sep, sep1
 from picoparse import cue, follow, seq, string
-from picoparse import not_followed_by, remaining
+from picoparse import not_followed_by, remaining, keyword_set, choice, tri
+from picoparse import capture, span, commit
+from picoparse import p as named, Parser
+from picoparse import recover, emit, Discarded, validate, keep_values, LookaheadExceeded
+from picoparse import Remaining, SequenceWalker, run_walker, Expectation, fail
+from picoparse.text import run_text_parser
 
 from utils import ParserTestCase
 
@@ -110,6 +118,22 @@ class TestTokenConsumers(ParserTestCase):
         self.assertNoMatch(one_b_to_d, 'a')
         self.assertNoMatch(one_b_to_d, 'e')
 
+    def testsatisfies_cached(self):
+        calls = []
+        def guard(i):
+            calls.append(i)
+            return 'b' <= i <= 'd'
+        cached_b_to_d = satisfies_cached(guard, limit=2)
+        self.assertMatch(p(many, cached_b_to_d), 'bcbcbdde', list('bcbcbdd'), 'e')
+        self.assertEquals(calls, list('bcdde'))
+        self.assertMatch(cached_b_to_d, 'd', 'd', '')
+        self.assertEquals(calls, list('bcdded'))
+        self.assertNoMatch(cached_b_to_d, '')
+        self.assertNoMatch(cached_b_to_d, 'a')
+        self.assertEquals(run(p(many, satisfies_cached(lambda l: l == [1])), [[1], [1], [2]]), 
+                          ([[1], [1]], [[2]]))
+        self.assertTrue(isinstance(cached_b_to_d, Parser))
+
     def testeof(self):
         self.assertMatch(eof, '', None, [])
         self.assertNoMatch(eof, 'a')
@@ -214,6 +238,17 @@ class TestSeparatorCombinators(ParserTestCase):
         self.assertNoMatch(one_or_more_as_sep_by_b, 'b')
         self.assertNoMatch(one_or_more_as_sep_by_b, 'ba')
         self.assertNoMatch(one_or_more_as_sep_by_b, 'bab')
+    
+    def testcommit_after_sep1(self):
+        # the failed 'b' at the end of the separated list must not stop the commit 
+        # from committing to sep_then_commit
+        @tri
+        def sep_then_commit():
+            one_or_more_as_sep_by_b()
+            commit()
+            return one_of('c')
+        self.assertMatch(p(choice, sep_then_commit, p(many, any_token)), 'abac', 'c', '')
+        self.assertNoMatch(p(choice, sep_then_commit, p(many, any_token)), 'abad')
 
 
 a_then_ret_b = p(cue, one_a, one_b)
@@ -295,6 +330,338 @@ class TestFuture(ParserTestCase):
         self.assertNoMatch(as_then_not_b, 'ab')
         self.assertNoMatch(as_then_not_b, 'aab')
 
+
+
+keywords = keyword_set(['in', 'int', 'if', 'i'])
+shortest_keywords = keyword_set(['in', 'int', 'if', 'i'], longest_match=False)
+bounded_keywords = keyword_set(['in', 'int', 'if'], boundary='abcdefghijklmnopqrstuvwxyz')
+keyword_or_word = p(choice, bounded_keywords, p(many1, p(not_one_of, ' ')))
+
+
+class TestKeywordSet(ParserTestCase):
+    def testkeyword_set(self):
+        self.assertTrue(isinstance(keywords, Parser))
+        self.assertTrue(picoparse._fun_to_str(keywords).startswith('_keyword_set at '))
+        self.assertMatch(keywords, 'in', 'in', '')
+        self.assertMatch(keywords, 'int', 'int', '')
+        self.assertMatch(keywords, 'inx', 'in', 'x')
+        self.assertMatch(keywords, 'if', 'if', '')
+        self.assertMatch(keywords, 'ix', 'i', 'x')
+        self.assertNoMatch(keywords, 'x')
+        self.assertNoMatch(keywords, '')
+    
+    def testshortest(self):
+        self.assertMatch(shortest_keywords, 'int', 'i', 'nt')
+    
+    def testboundary(self):
+        self.assertMatch(bounded_keywords, 'in', 'in', '')
+        self.assertMatch(bounded_keywords, 'in t', 'in', ' t')
+        self.assertMatch(bounded_keywords, 'int', 'int', '')
+        self.assertNoMatch(bounded_keywords, 'inx')
+        self.assertNoMatch(bounded_keywords, 'intx')
+        self.assertMatch(keyword_or_word, 'intx', list('intx'), '')
+        self.assertMatch(keyword_or_word, 'int x', 'int', ' x')
+    
+    def testno_backtracking_needed(self):
+        self.assertMatch(p(choice, keywords, p(string, 'xy')), 'xy', ['x', 'y'], '')
+        self.assertMatch(p(cue, keywords, remaining), 'ifx', ['x'], '')
+
+
+
+def committing_as():
+    for i in range(2):
+        one_a()
+        commit()
+    return 'ignored'
+
+captured_as = p(capture, p(many, one_a))
+captured_committing_as = p(capture, tri(committing_as))
+captured_nested = p(capture, p(cue, one_b, captured_committing_as))
+spanned_as = p(span, p(cue, one_b, p(many, one_a)))
+
+
+class TestCapture(ParserTestCase):
+    def testcapture(self):
+        for s in [lambda x: x, list, iter]:
+            self.assertMatch(captured_as, s('aab'), list('aa') if s is iter else s('aa'), 'b')
+            self.assertMatch(captured_as, s(''), [] if s is iter else s(''), '')
+            self.assertMatch(captured_committing_as, s('aaa'), list('aa') if s is iter else s('aa'), 'a')
+            self.assertMatch(captured_nested, s('baab'), list('baa') if s is iter else s('baa'), 'b')
+            self.assertNoMatch(captured_committing_as, s('ab'))
+        self.assertEquals(run(captured_as, deque('aab')), (['a', 'a'], ['b']))
+    
+    def testspan(self):
+        self.assertMatch(spanned_as, 'baab', (0, 3), 'b')
+        self.assertMatch(p(cue, one_b, spanned_as), 'bbaab', (1, 4), 'b')
+        self.assertNoMatch(spanned_as, 'aab')
+
+
+def committed_ab():
+    one_a()
+    commit()
+    return one_b()
+
+recovering_ab = p(recover, tri(committed_ab), p(one_of, ';'), 'error')
+statements = p(many, p(recover, p(follow, tri(committed_ab), p(one_of, ';')), p(one_of, ';'), 'error'))
+
+class TestRecover(ParserTestCase):
+    def testwithout_errors(self):
+        self.assertMatch(recovering_ab, 'ab', 'b', '')
+        self.assertNoMatch(recovering_ab, 'ac')
+        self.assertNoMatch(statements, 'ab;ac;')
+    
+    def testrecover(self):
+        errors = []
+        self.assertEquals(run(recovering_ab, 'ab', errors=errors), ('b', []))
+        self.assertEquals(errors, [])
+        self.assertEquals(run(statements, 'ab;ac;xab;ab;', errors=errors), 
+                          (['b', 'error', 'error', 'b'], []))
+        self.assertEquals([(e.pos, e.expecting) for e in errors], [(5, ['b']), (7, ['a'])])
+        self.assertTrue(errors[0].message)
+    
+    def testrecover_to_eof(self):
+        errors = []
+        self.assertEquals(run(recovering_ab, 'axxx', errors=errors), ('error', []))
+        self.assertEquals(len(errors), 1)
+    
+    def testbacktracked_errors_dropped(self):
+        recovered_then_x = tri(p(cue, p(recover, one_a, p(one_of, ';'), 'error'), p(one_of, 'x')))
+        errors = []
+        self.assertEquals(run(p(choice, recovered_then_x, p(string, 'b;y')), 'b;y', errors=errors), 
+                          (['b', ';', 'y'], []))
+        self.assertEquals(errors, [])
+        self.assertEquals(run(p(choice, recovered_then_x, p(string, 'b;y')), 'b;x', errors=errors), 
+                          ('x', []))
+        self.assertEquals([e.pos for e in errors], [1])
+    
+    def testerrors_kept_on_failure(self):
+        errors = []
+        self.assertRaises(NoMatch, run, p(cue, recovering_ab, one_b), 'ac;c', errors=errors)
+        self.assertEquals([e.pos for e in errors], [2])
+
+
+described = []
+
+def describe_x(token):
+    described.append(token)
+    return [token]
+
+def expecting_x():
+    fail([Expectation(describe_x, 'x')])
+
+class TestExpectations(ParserTestCase):
+    def setUp(self):
+        del described[:]
+    
+    def expecting(self, parser, input):
+        try:
+            run(parser, input)
+        except NoMatch, e:
+            return e.expecting
+        self.fail()
+    
+    def testswallowed_not_described(self):
+        self.assertMatch(p(optional, expecting_x, 'default'), 'a', 'default', 'a')
+        self.assertMatch(p(choice, expecting_x, one_a), 'a', 'a', '')
+        self.assertMatch(p(many, p(choice, expecting_x, one_a)), 'aab', ['a', 'a'], 'b')
+        self.assertEquals(described, [])
+    
+    def testdescribed_once(self):
+        try:
+            run(p(choice, expecting_x, one_a), 'b')
+        except NoMatch, e:
+            # run_parser renders the message of the failure it raises
+            self.assertEquals(described, ['x'])
+            self.assertEquals(e.expecting, ['a', 'x'])
+            self.assertEquals(e.expecting, ['a', 'x'])
+            self.assertEquals(described, ['x'])
+        else:
+            self.fail()
+    
+    def testrendered(self):
+        guard = lambda i: False
+        self.assertEquals(self.expecting(p(one_of, 'ba'), 'c'), ['b', 'a'])
+        self.assertEquals(self.expecting(p(not_one_of, 'ab'), 'a'), ["not_one_of'ab'"])
+        self.assertEquals(self.expecting(p(satisfies, guard), 'a'), 
+                          ["<satisfies predicate " + picoparse._fun_to_str(guard) + ">"])
+        self.assertEquals(self.expecting(p(not_followed_by, one_a), 'a'), 
+                          ["not " + picoparse._fun_to_str(one_a)])
+        self.assertEquals(self.expecting(p(choice, p(one_of, 'cb'), p(one_of, 'ba')), 'x'), 
+                          ['a', 'b', 'c'])
+    
+    def testjoin(self):
+        failures = [NoMatch('x', 1, [Expectation(list, 'ca')]), NoMatch('x', 1, ['b', 'a'])]
+        e = NoMatch.join(failures)
+        self.assertEquals((e.token, e.pos, e.expecting), ('x', 1, ['a', 'b', 'c']))
+        e.expecting = ['other']
+        self.assertEquals(e.expecting, ['other'])
+
+
+class TestParserOperators(ParserTestCase):
+    def testchoice(self):
+        a_or_b = one_a | one_b
+        self.assertMatch(a_or_b, 'ba', 'b', 'a')
+        self.assertNoMatch(a_or_b, 'c')
+        self.assertMatch(a_or_b | (lambda: 'c'), 'c', 'c', 'c')
+        self.assertMatch((lambda: 'c') | a_or_b, 'a', 'c', 'a')
+        self.assertEquals((a_or_b | one_a).args, (one_a, one_b, one_a))
+    
+    def testcue(self):
+        a_then_b = one_a >> one_b
+        self.assertMatch(a_then_b, 'abc', 'b', 'c')
+        self.assertNoMatch(a_then_b, 'ac')
+        self.assertEquals((a_then_b >> one_a).args, (one_a, one_b, one_a))
+        self.assertMatch(tri(a_then_b) | one_a, 'ac', 'a', 'c')
+    
+    def testnamed(self):
+        letter = named('letter', one_a | one_b)
+        self.assertTrue(isinstance(letter, Parser))
+        self.assertEquals((letter | one_a).args, (letter, one_a))
+        try:
+            run(letter, 'c')
+        except NoMatch, e:
+            self.assertEquals(e.expecting, ['letter'])
+        else:
+            self.fail()
+
+
+def emitting(kind, parser):
+    def emitting_block():
+        value = parser()
+        emit(kind, value)
+        return value
+    return emitting_block
+
+emitting_a = emitting('a', one_a)
+emitting_ab = p(cue, emitting_a, one_b)
+emitting_records = p(many, p(choice, tri(emitting_ab), emitting(('not', 'ab'), p(not_one_of, ';'))))
+
+class TestEmit(ParserTestCase):
+    def testsink(self):
+        events = []
+        self.assertEquals(run(p(many, emitting_a), 'aab', sink=events), (['a', 'a'], ['b']))
+        self.assertEquals(events, [('a', 'a'), ('a', 'a')])
+        calls = []
+        run(emitting_a, 'a', sink=lambda kind, value: calls.append(kind))
+        self.assertEquals(calls, ['a'])
+    
+    def testwithout_sink(self):
+        self.assertMatch(emitting_records, 'abac', ['b', 'a', 'c'], '')
+    
+    def testbacktracked_events_dropped(self):
+        events = []
+        self.assertEquals(run(emitting_records, 'abac', sink=events), (['b', 'a', 'c'], []))
+        self.assertEquals(events, [('a', 'a'), (('not', 'ab'), 'a'), (('not', 'ab'), 'c')])
+        events = []
+        run(p(optional, tri(p(cue, emitting_a, nothing))), 'a', sink=events)
+        self.assertEquals(events, [])
+    
+    def testfailure(self):
+        events = []
+        self.assertRaises(NoMatch, run, p(cue, emitting_a, emitting_a, one_b), 'aac', sink=events)
+        self.assertEquals(events, [('a', 'a'), ('a', 'a')])
+        events = []
+        self.assertRaises(NoMatch, run, p(cue, emitting_a, tri(p(cue, emitting_a, one_b))), 
+                          'aac', sink=events)
+        self.assertEquals(events, [('a', 'a')])
+        events = []
+        self.assertRaises(NoMatch, run, p(cue, p(optional, tri(emitting_ab)), one_b), 
+                          'ac', sink=events)
+        self.assertEquals(events, [])
+    
+    def testdiscard(self):
+        events = []
+        result, rest = run(p(many, emitting_a, discard=True), 'a' * 100 + 'b', sink=events)
+        self.assertTrue(isinstance(result, Discarded))
+        self.assertEquals((result, rest, len(events)), ([], ['b'], 100))
+        for combinator, input, rest in [(p(many1, one_a, discard=True), 'aab', ['b']), 
+                                        (p(sep, one_a, one_b, discard=True), 'abac', ['c']),
+                                        (p(sep, one_a, one_b, discard=True), 'c', ['c']),
+                                        (p(n_of, one_a, 2, discard=True), 'aab', ['b'])]:
+            self.assertEquals(run(combinator, input), ([], rest))
+        self.assertEquals(run(p(many_until, one_a, one_b, discard=True), 'aab'), (([], 'b'), []))
+        self.assertEquals(run(p(many_until1, one_a, one_b, True), 'aab'), (([], 'b'), []))
+    
+    def testdiscard_only_at_site(self):
+        seen = []
+        def group():
+            seen.append((many1(one_a), capture(p(many, one_b))))
+        result, rest = run(p(many, group, discard=True), 'aabab')
+        self.assertEquals((result, rest), ([], []))
+        self.assertEquals(seen, [(['a', 'a'], 'b'), (['a'], 'b')])
+
+
+class TestValidate(ParserTestCase):
+    def testvalidate(self):
+        self.assertEquals(validate(p(many, one_a), 'aab'), 2)
+        self.assertEquals(validate(p(sep1, p(many1, one_a), one_b), 'abaac'), 4)
+        self.assertEquals(validate(p(capture, p(many, one_a)), 'aab'), 2)
+        self.assertRaises(NoMatch, validate, p(many1, one_a), 'bbb')
+    
+    def testunread(self):
+        def source():
+            yield 'a'
+            yield 'b'
+            yield 'c'
+            self.fail("read past the token after the match")
+        self.assertEquals(validate(p(cue, one_a, one_b), source()), 2)
+    
+    def testnothing_built(self):
+        seen = []
+        def group():
+            seen.append((many1(one_a), capture(p(many, one_b)), string('c')))
+        self.assertEquals(validate(p(many, group), 'aabcabc'), 7)
+        self.assertEquals(seen, [([], [], []), ([], [], [])])
+        self.assertTrue(isinstance(seen[0][0], Discarded))
+    
+    def testkeep_values(self):
+        seen = []
+        @keep_values
+        def group():
+            seen.append(many1(one_a))
+            return seen[-1]
+        self.assertEquals(validate(p(many, group), 'aab'), 2)
+        self.assertEquals(seen, [['a', 'a']])
+        self.assertEquals(run(p(many, group), 'ab'), ([['a']], ['b']))
+        del seen[:]
+        def after():
+            seen.append(many(one_a))
+        failing = p(choice, keep_values(tri(p(cue, p(many, one_a), one_b))), after)
+        self.assertEquals(validate(failing, 'aa'), 2)
+        self.assertTrue(isinstance(seen[0], Discarded))
+    
+    def testcapture_not_held(self):
+        captured_as = p(capture, p(many, one_a))
+        self.assertRaises(LookaheadExceeded, run, captured_as, iter('a' * 100), max_lookahead=10)
+        self.assertEquals(validate(captured_as, iter('a' * 100), max_lookahead=10), 100)
+
+
+class TestLazyRemaining(ParserTestCase):
+    def testlazy(self):
+        result, rest = run(many_as, 'aab', lazy=True)
+        self.assertTrue(isinstance(rest, Remaining))
+        self.assertEquals((result, rest.offset, list(rest)), (['a', 'a'], 2, ['b']))
+        result, rest = run(many_as, 'aa', lazy=True)
+        self.assertEquals((rest.offset, list(rest)), (2, []))
+    
+    def testnot_drained(self):
+        pulled = []
+        def source():
+            for i in range(1000):
+                pulled.append(i)
+                yield 'a'
+        result, rest = run(p(n_of, one_a, 2), source(), lazy=True)
+        self.assertTrue(len(pulled) <= 3)
+        self.assertEquals(len(list(rest)), 998)
+    
+    def testtext(self):
+        result, rest = run_text_parser(one_a, 'ab\ncd\ne', lazy=True)
+        self.assertEquals(list(rest), list('b\ncd\ne'))
+    
+    def testsequence(self):
+        result, rest = run_walker(one_a, SequenceWalker('abc'), lazy=True)
+        self.assertEquals((result, rest.offset, list(rest)), ('a', 1, ['b', 'c']))
+
                         
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+if __name__ == '__main__':
+    import sys
+    from os import path
+    sys.path.insert(0, path.abspath(path.join(path.dirname(sys.argv[0]), '..')))
+
+import unittest
+
+from picoparse import partial as p, p as named
+from picoparse import one_of, not_one_of, string, choice, many, many1, cue, seq, tri
+from picoparse import many_until, NoMatch, LookaheadExceeded, run_parser, local_ps
+from picoparse.analysis import first_set, firsts, predict, optimise
+from picoparse.text import char_class
+
+from utils import ParserTestCase
+
+one_a = p(one_of, 'a')
+one_b = p(one_of, 'b')
+abc = p(string, 'abc')
+bcd = p(string, 'bcd')
+
+class TestFirstSet(unittest.TestCase):
+    def testprimitives(self):
+        self.assertEquals(first_set(p(one_of, 'ab')), frozenset('ab'))
+        self.assertEquals(first_set(abc), frozenset('a'))
+        self.assertEquals(first_set(p(string, '')), None)
+        self.assertEquals(first_set(p(not_one_of, 'a')), None)
+    
+    def testcombinators(self):
+        self.assertEquals(first_set(p(choice, abc, bcd)), frozenset('ab'))
+        self.assertEquals(first_set(p(cue, one_a, one_b)), frozenset('a'))
+        self.assertEquals(first_set(p(seq, ('A', one_a), one_b)), frozenset('a'))
+        self.assertEquals(first_set(p(many1, one_b)), frozenset('b'))
+        self.assertEquals(first_set(p(many1, one_b, discard=True)), frozenset('b'))
+        self.assertEquals(first_set(p(many_until, one_a, one_b)), frozenset('ab'))
+        self.assertEquals(first_set(tri(abc)), frozenset('a'))
+        self.assertEquals(first_set(named('abc', abc)), frozenset('a'))
+    
+    def testunknown(self):
+        self.assertEquals(first_set(p(many, one_a)), None)
+        self.assertEquals(first_set(p(choice, abc, p(many, one_a))), None)
+        self.assertEquals(first_set(lambda: one_a()), None)
+    
+    def testfirsts(self):
+        self.assertEquals(first_set(firsts('x')(lambda: one_of('x'))), frozenset('x'))
+
+
+calls = []
+
+def counted(name, parser):
+    def counted_block():
+        calls.append(name)
+        return parser()
+    return counted_block
+
+predicted = predict(firsts('a')(counted('abc', tri(abc))), 
+                    firsts('b')(counted('bcd', tri(bcd))),
+                    counted('other', p(one_of, 'c')))
+
+class TestPredict(ParserTestCase):
+    def setUp(self):
+        del calls[:]
+    
+    def testmatch(self):
+        self.assertMatch(predicted, 'abc', ['a', 'b', 'c'], '')
+        self.assertMatch(predicted, 'bcde', ['b', 'c', 'd'], 'e')
+        self.assertMatch(predicted, 'c', 'c', '')
+        self.assertNoMatch(predicted, 'd')
+        self.assertNoMatch(predicted, '')
+
+    def testdispatch(self):
+        self.assertMatch(predicted, 'abc', ['a', 'b', 'c'], '')
+        self.assertEquals(calls, ['abc'])
+        del calls[:]
+        self.assertNoMatch(predicted, 'abd')
+        self.assertEquals(calls, ['abc', 'other'])
+    
+    def testknown_only(self):
+        known = predict(tri(abc), tri(bcd))
+        self.assertMatch(known, 'bcd', ['b', 'c', 'd'], '')
+        self.assertNoMatch(known, 'c')
+        self.assertEquals(first_set(known), frozenset('ab'))
+    
+    def testunlisted_containers(self):
+        digit = p(one_of, char_class([('0', '9')]))
+        self.assertEquals(first_set(digit), None)
+        self.assertMatch(predict(digit, p(one_of, 'x')), '5', '5', '')
+        self.assertEquals(first_set(p(one_of, xrange(3))), None)
+        self.assertMatch(predict(p(one_of, xrange(3)), p(one_of, [5])), [1], 1, [])
+
+
+class TestOptimise(ParserTestCase):
+    def testoptimise(self):
+        grammar = p(many, named('ab', choice, tri(abc), p(cue, one_b, p(choice, one_a, one_b))))
+        optimised = optimise(grammar)
+        for s, expected, rest in [('abcba', ['abc', 'a'], ''), ('bbabcx', ['b', 'abc'], 'x'), 
+                                  ('', [], '')]:
+            expected = [len(e) == 3 and list(e) or e for e in expected]
+            self.assertMatch(grammar, s, expected, rest)
+            self.assertMatch(optimised, s, expected, rest)
+        self.assertEquals(first_set(optimised.args[0]), frozenset('ab'))
+    
+    def testcommit(self):
+        sizes = []
+        def x():
+            sizes.append(len(local_ps.value.buffer))
+            return one_of('x')
+        record = lambda start: tri(p(cue, p(one_of, start), p(many, x), p(one_of, ';')))
+        records = p(many, p(choice, record('a'), record('b')))
+        text = 'a' + 'x' * 100 + ';b;'
+        self.assertEquals(run_parser(optimise(records), text), ([';', ';'], []))
+        self.assertTrue(max(sizes) > 100)
+        del sizes[:]
+        self.assertEquals(run_parser(optimise(records, commit=True), text), ([';', ';'], []))
+        self.assertTrue(max(sizes) <= 2)
+        self.assertRaises(LookaheadExceeded, run_parser, optimise(records), text, 
+                          max_lookahead=10)
+        self.assertEquals(run_parser(optimise(records, commit=True), text, max_lookahead=10), 
+                          ([';', ';'], []))
+        # inside a tri nothing is committed, so the tri can still be backtracked out of
+        self.assertEquals(run_parser(p(choice, tri(p(cue, optimise(records, commit=True), 
+                                                      p(one_of, '!'))), 
+                                       p(one_of, 'a')), 'a;b;'), ('a', [';', 'b', ';']))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+__all__ = [cls.__name__ for name, cls in locals().items()
+                        if isinstance(cls, type) 
+                        and name.startswith('Test')]
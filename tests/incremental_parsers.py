@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+if __name__ == '__main__':
+    import sys
+    from os import path
+    sys.path.insert(0, path.abspath(path.join(path.dirname(sys.argv[0]), '..')))
+
+import unittest
+
+from picoparse import partial as p
+from picoparse import NoMatch, one_of, many, many1, satisfies, commit, tri, run_parser
+from picoparse.text import whitespace, lexeme, capture
+from picoparse.incremental import IncrementalParser, memoise
+
+calls = [0]
+
+@tri
+def assignment():
+    calls[0] += 1
+    name = lexeme(p(capture, p(many1, p(satisfies, unicode.isalpha))))
+    one_of('=')
+    commit()
+    value = lexeme(p(capture, p(many1, p(satisfies, unicode.isdigit))))
+    one_of(';')
+    return name, int(value)
+
+statement = memoise(assignment)
+program = p(many, statement)
+
+def source(n):
+    return u''.join(u'v%s = %d;\n' % (u'abcdefghij'[i % 10] * (i // 10 + 1), i) for i in range(n))
+
+
+class TestIncrementalParser(unittest.TestCase):
+    def assertReparsed(self, doc):
+        self.assertEquals(doc.parse(), run_parser(program, doc.text))
+    
+    def testparse(self):
+        doc = IncrementalParser(program, source(3))
+        self.assertEquals(doc.parse(), ([(u'va', 0), (u'vb', 1), (u'vc', 2)], [u'\n']))
+        calls[0] = 0
+        doc.parse()
+        self.assertEquals(calls[0], 0)
+    
+    def testedit(self):
+        doc = IncrementalParser(program, source(100))
+        doc.parse()
+        text = doc.text
+        calls[0] = 0
+        offset = text.index(u'= 50;') + 2
+        result, rest = doc.edit(offset, 2, u'123')
+        self.assertEquals(result[50], (text.split()[150], 123))
+        self.assertEquals(calls[0], 1)
+        self.assertReparsed(doc)
+    
+    def testmany_edits(self):
+        doc = IncrementalParser(program, source(50), max_generations=4)
+        doc.parse()
+        for i in range(10):
+            calls[0] = 0
+            doc.edit(0, 0, u'%s=%d;' % (u'x' * (i + 1), i))
+            self.assertEquals(calls[0], 1)
+            self.assertReparsed(doc)
+        calls[0] = 0
+        doc.edit(len(doc.text), 0, u'end = 1;')
+        self.assertEquals(calls[0], 1)
+        self.assertReparsed(doc)
+    
+    def testjoining_edit(self):
+        doc = IncrementalParser(program, u'a = 1;\nb = 2;\nc = 3;')
+        doc.parse()
+        calls[0] = 0
+        self.assertEquals(doc.edit(5, 7, u''), ([(u'a', 1), (u'c', 3)], []))
+        self.assertEquals(calls[0], 1)
+        self.assertEquals(doc.edit(5, 0, u'')[0], [(u'a', 1), (u'c', 3)])
+    
+    def testfailure(self):
+        doc = IncrementalParser(program, u'a = 1;\nb = 2;')
+        doc.parse()
+        self.assertRaises(NoMatch, doc.edit, 11, 1, u'x')
+        self.assertEquals(doc.edit(11, 1, u'3')[0], [(u'a', 1), (u'b', 3)])
+        self.assertEquals(doc.edit(7, 1, u'')[1], list(u'\n = 3;'))
+        self.assertRaises(ValueError, doc.edit, 20, 1, u'')
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+__all__ = [cls.__name__ for name, cls in locals().items()
+                        if isinstance(cls, type) 
+                        and name.startswith('Test')]
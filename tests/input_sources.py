@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+if __name__ == '__main__':
+    import sys
+    from os import path
+    sys.path.insert(0, path.abspath(path.join(path.dirname(sys.argv[0]), '..')))
+
+import unittest
+import bz2
+import gzip
+import os
+import shutil
+import tempfile
+import time
+from StringIO import StringIO
+
+from picoparse import partial as p
+from picoparse import NoMatch, one_of, not_one_of, many, run_parser
+from picoparse.text import run_text_parser, as_string
+from picoparse.sources import ReadAhead, Decompressed, open_source, lzma
+
+words = p(many, p(not_one_of, ' '))
+
+class Endless(object):
+    """A file of endless 'a's that counts its reads"""
+    def __init__(self):
+        self.reads = 0
+    
+    def read(self, size):
+        self.reads += 1
+        return 'a' * size
+
+class Broken(object):
+    def read(self, size):
+        raise IOError("broken")
+
+def wait_for(condition):
+    for i in range(100):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+class TestReadAhead(unittest.TestCase):
+    def testbytes(self):
+        source = ReadAhead(StringIO('aaab'), block_size=2)
+        self.assertEquals(run_parser(p(many, p(one_of, 'a')), source), (['a'] * 3, ['b']))
+    
+    def testdecode(self):
+        text = u'h\xe9llo w\xf6rld \u2603'
+        for block_size in [1, 2, 3, 1024]:
+            source = ReadAhead(StringIO(text.encode('utf-8')), 'utf-8', block_size)
+            self.assertEquals(run_text_parser(as_string(words), source), 
+                              (u'h\xe9llo', list(u' w\xf6rld \u2603')))
+    
+    def testtext_diagnostics(self):
+        source = ReadAhead(StringIO(u'ab\nc\xe9d'.encode('utf-8')), 'utf-8', 1)
+        try:
+            run_text_parser(p(many, p(not_one_of, u'\xe9')) >> p(one_of, 'x'), source)
+        except NoMatch, e:
+            self.assertEquals((e.pos.row, e.pos.col), (2, 2))
+        else:
+            self.fail()
+    
+    def testerrors(self):
+        self.assertRaises(IOError, run_parser, words, ReadAhead(Broken()))
+        source = ReadAhead(StringIO('ab\xff'), 'utf-8', 1)
+        self.assertRaises(UnicodeDecodeError, run_text_parser, words, source)
+    
+    def testbounded(self):
+        file = Endless()
+        source = ReadAhead(file, block_size=10, blocks=2)
+        self.assertTrue(wait_for(source.queue.full))
+        time.sleep(0.05)
+        self.assertTrue(file.reads <= 3)
+        source.close()
+        self.assertTrue(wait_for(lambda: not source.thread.isAlive()))
+    
+    def testclosed_when_abandoned(self):
+        source = ReadAhead(Endless(), block_size=10, blocks=2)
+        tokens = iter(source)
+        self.assertEquals(tokens.next(), 'a')
+        del tokens
+        self.assertTrue(wait_for(lambda: not source.thread.isAlive()))
+
+def gzipped(data):
+    out = StringIO()
+    f = gzip.GzipFile(fileobj=out, mode='wb')
+    f.write(data)
+    f.close()
+    return out.getvalue()
+
+def read_all(file, size):
+    out = []
+    while True:
+        data = file.read(size)
+        if not data:
+            return ''.join(out)
+        out.append(data)
+
+text = u''.join(u'line %d: caf\xe9\n' % i for i in range(500)).encode('utf-8')
+compressed = [('gzip', gzipped(text)), ('bz2', bz2.compress(text))]
+if lzma is not None:
+    compressed.append(('xz', lzma.compress(text)))
+
+class TestDecompressed(unittest.TestCase):
+    def testformats(self):
+        for format, data in compressed:
+            for block_size in [7, 65536]:
+                self.assertEquals(read_all(Decompressed(StringIO(data), format, block_size), 100), 
+                                  text)
+    
+    def testrecognised(self):
+        for format, data in compressed:
+            file = Decompressed(StringIO(data), block_size=2)
+            self.assertEquals(read_all(file, 1000), text)
+            self.assertEquals(file.format, format)
+        self.assertRaises(ValueError, Decompressed(StringIO(text)).read, 10)
+        self.assertEquals(Decompressed(StringIO('')).read(10), '')
+    
+    def testmembers(self):
+        for format, data in compressed:
+            self.assertEquals(read_all(Decompressed(StringIO(data * 2), format, 100), 1000), 
+                              text * 2)
+    
+    def testmember_at_block_end(self):
+        for format, data in compressed:
+            file = Decompressed(StringIO(data * 2), format, len(data))
+            self.assertEquals(read_all(file, 1000), text * 2)
+    
+    def testtruncated(self):
+        for format, data in compressed:
+            for end in [len(data) // 2, len(data) - 1]:
+                for block_size in [7, 65536]:
+                    file = Decompressed(StringIO(data[:end]), format, block_size)
+                    self.assertRaises(EOFError, read_all, file, 1000)
+    
+    def testzero_padding(self):
+        data = gzipped(text)
+        for block_size in [7, len(data), 65536]:
+            for padded in [data + '\0' * 10, data + '\0' * 10 + data]:
+                file = Decompressed(StringIO(padded), 'gzip', block_size)
+                self.assertEquals(read_all(file, 1000), text * padded.count(data))
+    
+    def testbounded(self):
+        data = gzipped('a' * (10 * 1024 * 1024))
+        file = Decompressed(StringIO(data), 'gzip', 4096)
+        total = 0
+        while True:
+            chunk = file.read(65536)
+            if not chunk:
+                break
+            self.assertTrue(len(file.pending) <= 4096)
+            total += len(chunk)
+        self.assertEquals(total, 10 * 1024 * 1024)
+    
+    def testopen_source(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for name, data in [('log.gz', gzipped(text)), ('log.bz2', bz2.compress(text)), 
+                               ('log', text)]:
+                path = os.path.join(directory, name)
+                f = open(path, 'wb')
+                f.write(data)
+                f.close()
+                source = open_source(path, 'utf-8', block_size=64)
+                result, rest = run_text_parser(as_string(words), source)
+                self.assertEquals((result, len(rest)), (u'line', len(text.decode('utf-8')) - 4))
+                self.assertTrue(wait_for(lambda: source.file.closed if name == 'log' 
+                                                 else source.file.file.closed))
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
+
+__all__ = [cls.__name__ for name, cls in locals().items()
+                        if isinstance(cls, type) 
+                        and name.startswith('Test')]
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+if __name__ == '__main__':
+    import sys
+    from os import path
+    sys.path.insert(0, path.abspath(path.join(path.dirname(sys.argv[0]), '..')))
+
+import unittest
+from string import ascii_lowercase
+
+from picoparse import partial as p
+from picoparse import NoMatch, sep1, many, choice
+from picoparse.lexer import Lexer, literal, run, quoted, keywords, skip, token, run_lexer_parser
+
+lexer = Lexer([
+    skip(run('space', ' \n')),
+    run('ident', ascii_lowercase, ascii_lowercase + '0123'),
+    keywords(['let', 'in'], 'ident', 'keyword'),
+    run('number', '0123'),
+    quoted('string', '"', '\\'),
+    literal('='),
+    literal('->'),
+    run('op', '+-=>'),
+    literal('('),
+])
+
+def lex(text):
+    return list(lexer.tokens(text))
+
+class TestLexer(unittest.TestCase):
+    def testrun(self):
+        self.assertEquals(lex('abc x1'), [('ident', 'abc', 0), ('ident', 'x1', 4)])
+        self.assertEquals(lex('0123'), [('number', '0123', 0)])
+        self.assertEquals(lex(''), [])
+        self.assertEquals(lex('  \n '), [])
+    
+    def testlongest_match(self):
+        self.assertEquals(lex('= == -> ->-'), [('=', '=', 0), ('op', '==', 2), 
+                                              ('->', '->', 5), ('op', '->-', 8)])
+        self.assertEquals(lex('a1('), [('ident', 'a1', 0), ('(', '(', 2)])
+    
+    def testkeywords(self):
+        self.assertEquals(lex('lt in int'), [('ident', 'lt', 0), ('keyword', 'in', 3), 
+                                             ('ident', 'int', 6)])
+    
+    def testquoted(self):
+        self.assertEquals(lex('"a b" "a\\"b"'), [('string', '"a b"', 0), 
+                                                 ('string', '"a\\"b"', 6)])
+        self.assertEquals(lex('"="'), [('string', '"="', 0)])
+        self.assertRaises(NoMatch, lex, '"ab')
+    
+    def testno_match(self):
+        self.assertRaises(NoMatch, lex, 'abc ?')
+        try:
+            lex('ab ?')
+        except NoMatch, e:
+            self.assertEquals(e.pos, 3)
+            self.assertEquals(e.token, '?')
+
+
+assignment = p(sep1, p(token, 'ident'), p(token, '='))
+
+class TestTokenParsers(unittest.TestCase):
+    def testtoken(self):
+        result, rest = run_lexer_parser(assignment, lexer, 'a = b = c in')
+        self.assertEquals([t[1] for t in result], ['a', 'b', 'c'])
+        self.assertEquals(rest, [('keyword', 'in', 10)])
+    
+    def testtoken_text(self):
+        let = p(token, 'keyword', 'let')
+        self.assertEquals(run_lexer_parser(let, lexer, 'let'), (('keyword', 'let', 0), []))
+        self.assertRaises(NoMatch, run_lexer_parser, let, lexer, 'in')
+        self.assertRaises(NoMatch, run_lexer_parser, let, lexer, '')
+    
+    def testchoice(self):
+        value = p(choice, p(token, 'number'), p(token, 'string'))
+        result, rest = run_lexer_parser(p(many, value), lexer, '1 "2" 3 x')
+        self.assertEquals([t[1] for t in result], ['1', '"2"', '3'])
+        self.assertEquals(rest, [('ident', 'x', 8)])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+__all__ = [cls.__name__ for name, cls in locals().items()
+                        if isinstance(cls, type) 
+                        and name.startswith('Test')]
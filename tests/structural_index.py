@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+if __name__ == '__main__':
+    import sys
+    from os import path
+    sys.path.insert(0, path.abspath(path.join(path.dirname(sys.argv[0]), '..')))
+
+import unittest
+from bisect import bisect_left
+
+from picoparse import partial as p
+from picoparse import NoMatch, one_of, many, cue, follow, tri, choice, sep
+from picoparse.text import run_text_parser
+import picoparse.index
+from picoparse.index import StructuralIndex, take_until, run_indexed_parser, numpy
+from picoparse.index import structural_chars
+
+text = 'a <b c="d">\n"e" [f]\n\ng'
+
+quote = p(one_of, '"')
+value = p(follow, p(cue, quote, p(take_until, '"')), quote)
+attribute = p(follow, p(take_until, ' ="'), p(one_of, '='))
+attributes = p(many, p(cue, p(one_of, ' '), p(choice, tri(p(cue, attribute, value)), 
+                                                  p(take_until, ' '))))
+
+class TestStructuralIndex(unittest.TestCase):
+    def indexes(self, sequence):
+        yield StructuralIndex(sequence, vectorised=False)
+        if numpy is not None:
+            yield StructuralIndex(sequence, vectorised=True)
+    
+    def testfind(self):
+        for index in self.indexes(text):
+            self.assertEquals(sorted(index.positions['"']), [7, 9, 12, 14])
+            self.assertEquals(index.find('"'), 7)
+            self.assertEquals(index.find('"<', 0), 2)
+            self.assertEquals(index.find('"', 10), 12)
+            self.assertEquals(index.find('"', 10, 12), None)
+            self.assertEquals(index.find('{'), None)
+            self.assertRaises(ValueError, index.find, 'x')
+            self.assertEquals(index.count('\n'), 3)
+            self.assertEquals(index.count('"', 8, 13), 2)
+    
+    def testunicode(self):
+        for index in self.indexes(u'\xe9<\u2603>'):
+            self.assertEquals(index.find('>'), 3)
+    
+    @unittest.skipIf(numpy is None, "needs numpy")
+    def testvectorised(self):
+        sequence = u'\U0001f600<a\u2603>\n[\xe9]' * 3 + text.decode('ascii')
+        for s in [sequence, text]:
+            plain = StructuralIndex(s, vectorised=False)
+            vectorised = StructuralIndex(s, vectorised=True)
+            for c in structural_chars:
+                self.assertEquals(list(vectorised.positions[c]), plain.positions[c])
+                self.assertEquals(vectorised.find(c, 3), plain.find(c, 3))
+            self.assertEquals(list(vectorised.lines()), list(plain.lines()))
+    
+    def testnarrow(self):
+        old = picoparse.index._narrow
+        picoparse.index._narrow = True
+        try:
+            sequence = u'\U0001f600<'
+            index = StructuralIndex(sequence, vectorised=True)
+            self.assertEquals(index.find('<'), sequence.index('<'))
+            self.assertEquals(index.search, bisect_left)
+        finally:
+            picoparse.index._narrow = old
+    
+    def testlist(self):
+        index = StructuralIndex(list(text), vectorised=False)
+        self.assertEquals(index.find('['), 16)
+    
+    def testlines(self):
+        for index in self.indexes(text):
+            self.assertEquals([text[start:end] for start, end in index.lines()], 
+                              text.split('\n'))
+            self.assertEquals(list(StructuralIndex('a\n', vectorised=False).lines()), [(0, 1)])
+    
+    def testlocation(self):
+        for index in self.indexes(text):
+            for pos, row, col in [(1, 1, 1), (12, 1, 12), (13, 2, 1), (20, 2, 8), (22, 4, 1)]:
+                location = index.location(pos)
+                self.assertEquals((location.row, location.col), (row, col))
+            self.assertEquals([index.line(row) for row in range(1, 5)], text.split('\n'))
+
+
+class TestIndexedParsing(unittest.TestCase):
+    def testtake_until(self):
+        self.assertEquals(run_indexed_parser(p(take_until, '<'), text), ('a ', list(text[2:])))
+        self.assertEquals(run_indexed_parser(p(take_until, '{'), text), (text, []))
+        self.assertEquals(run_indexed_parser(p(take_until, 'c'), text), 
+                          run_text_parser(p(take_until, 'c'), text))
+    
+    def testgrammar(self):
+        tag = ' x="y" z w="v"'
+        expected = (['y', 'z', 'v'], [])
+        self.assertEquals(run_indexed_parser(attributes, tag, ' ="'), expected)
+        self.assertEquals(run_indexed_parser(attributes, tag), expected)
+        self.assertEquals(run_text_parser(attributes, tag), expected)
+    
+    def testerror_location(self):
+        try:
+            run_indexed_parser(p(cue, p(take_until, '\n'), p(one_of, '\n'), p(one_of, 'x')), text)
+        except NoMatch, e:
+            self.assertTrue('line 2:1' in e.message)
+            self.assertTrue(repr('"e" [f]') in e.message)
+        else:
+            self.fail()
+
+if __name__ == '__main__':
+    unittest.main()
+
+__all__ = [cls.__name__ for name, cls in locals().items()
+                        if isinstance(cls, type) 
+                        and name.startswith('Test')]
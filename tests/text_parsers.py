@@ -29,12 +29,20 @@ if __name__ == '__main__':
     sys.path.insert(0, path.abspath(path.join(path.dirname(sys.argv[0]), '..')))
 
 import unittest
+from collections import deque
 
 import core_parsers
 import string
+import imp
+import os
+import shutil
+import tempfile
+from os import path as os_path
 from picoparse import partial as p
 from picoparse.text import newline, whitespace_char, whitespace, whitespace1
-from picoparse.text import lexeme, quote, quoted, caseless_string, run_text_parser
+from picoparse.text import lexeme, quote, quoted, caseless_string, run_text_parser, validate_text
+from picoparse.text import TextDiagnostics, Pos, CharClass, char_class, char_spec
+from picoparse import EndOfFile, NoMatch, LookaheadExceeded, tri, many, one_of, cue
 
 from utils import TextParserTestCase
 
@@ -58,6 +66,14 @@ class TestTextFuture(core_parsers.TestFuture):
     def run_parser(self, *args):
 		return run_text_parser(*args)
 
+class TestTextKeywordSet(core_parsers.TestKeywordSet):
+    def run_parser(self, *args):
+		return run_text_parser(*args)
+
+class TestTextCapture(core_parsers.TestCapture):
+    def run_parser(self, *args):
+		return run_text_parser(*args)
+
 whitespace_strings = [' ', '  ', '   ', '\n', '\t', '\n \n\r\t\n \t']
 
 class TestWhitespaceParsers(TextParserTestCase):
@@ -81,6 +97,11 @@ class TestWhitespaceParsers(TextParserTestCase):
         for ws in whitespace_strings:
             self.assertMatch(whitespace, ws, ws, '')
             self.assertMatch(whitespace, ws + 'a', ws, 'a')
+    
+    def testwhitespace_committed(self):
+        self.assertEquals(run_text_parser(whitespace, iter(' ' * 100 + 'a'), max_lookahead=10), 
+                          (' ' * 100, ['a']))
+        self.assertEquals(run_text_parser(whitespace, deque('  a')), ('  ', ['a']))
 
     def testwhitespace1(self):
         self.assertNoMatch(whitespace1, '')
@@ -124,6 +145,81 @@ class TestSimpleParsers(TextParserTestCase):
     def testcaseless_string(self):
         raise Exception('not implemented')
 
+class TestTextDiagnostics(unittest.TestCase):
+    def setUp(self):
+        self.diag = TextDiagnostics(context=1)
+        self.text = ''.join('line %d\n' % i for i in range(1, 10))
+    
+    def test_bounded(self):
+        for ch, pos in self.diag.wrap(iter(self.text)):
+            self.assert_(len(self.diag.lines) <= 3)
+            self.assert_(('line %d\n' % pos.row).startswith(self.diag.window(pos)[-1]))
+        diag = TextDiagnostics(context=1, line_limit=5)
+        list(diag.wrap(iter('a' * 100 + '\nb')))
+        self.assertEquals(diag.window(Pos(2, 1)), ['aaaaa', 'b'])
+    
+    def test_lazy(self):
+        pulled = []
+        def source():
+            for i in xrange(200000):
+                pulled.append(i)
+                yield 'a'
+        self.assertRaises(LookaheadExceeded, run_text_parser, tri(p(many, p(one_of, 'a'))), 
+                          source(), max_lookahead=100)
+        self.assert_(len(pulled) <= 101)
+    
+    def test_window(self):
+        list(self.diag.wrap(iter(self.text + 'end')))
+        self.assertEquals(self.diag.window(Pos(8, 1)), ['line 7\n', 'line 8\n', 'line 9\n'])
+        self.assertEquals(self.diag.window(Pos(9, 1)), ['line 8\n', 'line 9\n', 'end'])
+        self.assertEquals(self.diag.window(Pos(1, 1)), [])
+        self.assertEquals(self.diag.window(EndOfFile), ['end'])
+    
+    def test_cut(self):
+        i = self.diag.wrap(iter(self.text))
+        for ch, pos in i:
+            if pos.row == 5:
+                break
+        self.diag.cut(pos)
+        self.assertEquals(list(self.diag.lines), [])
+        self.assertEquals(self.diag.window(pos), ['l'])
+
+
+class TestCharClass(TextParserTestCase):
+    def testmerge(self):
+        self.assertEquals(CharClass([('d', 'f'), ('a', 'c'), (0x100, 0x200), (0x150, 0x160)]).ranges,
+                          [(0x61, 0x66), (0x100, 0x200)])
+        self.assertEquals((char_class([('a', 'a')]) | char_class([('b', 'z')])).ranges, 
+                          [(0x61, 0x7A)])
+    
+    def testcontains(self):
+        letters = char_class([('a', 'z'), ('A', 'Z'), (0xC0, 0xD6), (0x10000, 0xEFFFF)])
+        for c in u'azAZ\xC0\xD6\U00010000':
+            self.assert_(c in letters, c)
+        for c in [u'0', u'@', u'\xBF', u'\xD7', u'\uFFFF', u'\U000F0000', EndOfFile, u'ab', 1]:
+            self.assert_(c not in letters, c)
+    
+    def testparser(self):
+        digit = char_class([('0', '9')])
+        self.assertMatch(digit, '1a', '1', 'a')
+        self.assertNoMatch(digit, 'a')
+        self.assertNoMatch(digit, '')
+    
+    def testchar_spec(self):
+        spec = char_spec(' ":" | [A-Z] | #xB7 | [#x0300-#x036F] | [a-z]')
+        self.assertEquals(spec.ranges, [(0x3A, 0x3A), (0x41, 0x5A), (0x61, 0x7A), (0xB7, 0xB7), 
+                                        (0x300, 0x36F)])
+        self.assertMatch(spec, u'\u0301x', u'\u0301', 'x')
+        try:
+            run_text_parser(spec, '1')
+        except NoMatch, e:
+            self.assertEquals(e.expecting, [spec])
+            self.assert_('":" | [A-Z]' in e.default_message)
+        else:
+            self.fail()
+        self.assertRaises(NoMatch, char_spec, '[A-Z] |')
+
+
 class TestLiterals(TextParserTestCase):
     def make_literal(self):
         raise Exception('not implemented')
@@ -189,6 +285,59 @@ class TestWrappers:
         self.assertNoMatch(parser, before + after)
 
 
+def load_example(name):
+    """Loads examples/name.py as a module; the example names can't be imported directly"""
+    filename = os_path.join(os_path.dirname(os_path.abspath(__file__)), '..', 'examples', 
+                            name + '.py')
+    return imp.load_source('example_' + name, filename)
+
+class TestValidateExamples(unittest.TestCase):
+    """validate_text must agree with run_text_parser on the example grammars, which read 
+    the results of many and capture to compare tags and build numbers"""
+    def setUp(self):
+        # the xml example caches artifacts, which mustn't go in the real cache
+        self.old_cache = os.environ.get('PICOPARSE_CACHE')
+        self.cache = tempfile.mkdtemp()
+        os.environ['PICOPARSE_CACHE'] = self.cache
+    
+    def tearDown(self):
+        shutil.rmtree(self.cache)
+        if self.old_cache is None:
+            del os.environ['PICOPARSE_CACHE']
+        else:
+            os.environ['PICOPARSE_CACHE'] = self.old_cache
+    
+    def assertAgrees(self, parser, text):
+        try:
+            result, rest = run_text_parser(parser, text)
+        except NoMatch:
+            self.assertRaises(NoMatch, validate_text, parser, text)
+        else:
+            self.assertEquals(validate_text(parser, text), len(text) - len(rest))
+    
+    def testxml(self):
+        xml = load_example('xml')
+        for text in [u'<root><ab>hi</ab></root>', u'<root><ab>hi</ax></root>', 
+                     u'<?xml version="1.0" ?><r a="b">t &amp; u<!-- c --></r> ', 
+                     u'<r>&#65;&#x41;&bad;</r>', u'<r>&#65;&#x41;&lt;</r>']:
+            self.assertAgrees(xml.xml, text)
+        self.assertRaises(NoMatch, validate_text, xml.xml, u'<root><ab>hi</ax></root>')
+    
+    def testlambda(self):
+        lambda_ = load_example('lambda')
+        for text in [u'let x = 5 in x', u'def f = fn n -> n let x = 1.5 in f x', 
+                     u'let x = in x']:
+            self.assertAgrees(lambda_.program, text)
+        self.assertEquals(validate_text(lambda_.program, u'let x = 5 in x'), 14)
+    
+    def testemailaddress(self):
+        email = load_example('emailaddress')
+        line = p(cue, email.address, p(one_of, '\n'))
+        for text in [u'a@b.com\n', u'Joe <j@x.org>\n', u'foo bar\n']:
+            self.assertAgrees(line, text)
+        self.assertTrue(email.validate_address(u'Joe <j@x.org>\n'))
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# Copyright (c) 2009, Andrew Brehaut, Steven Ashley
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, 
+#   this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice, 
+#   this list of conditions and the following disclaimer in the documentation  
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+
+if __name__ == '__main__':
+    import sys
+    from os import path
+    sys.path.insert(0, path.abspath(path.join(path.dirname(sys.argv[0]), '..')))
+
+import unittest
+
+from picoparse import partial as p
+from picoparse import NoMatch, one_of, run_parser
+from picoparse.trampoline import trampoline, result, choice, optional, tri, many, many1
+from picoparse.trampoline import cue, follow, described
+
+from utils import ParserTestCase
+
+def bracketed():
+    one_of('[')
+    v = yield expression
+    one_of(']')
+    yield ['bracket', v]
+
+def parened():
+    one_of('(')
+    v = yield expression
+    one_of(')')
+    yield ['paren', v]
+
+part = p(choice, bracketed, parened)
+expression = p(described, 'expression', many, part)
+
+one_a = p(one_of, 'a')
+one_b = p(one_of, 'b')
+
+def a_then_b():
+    yield one_a
+    yield one_b
+
+def returns_parser():
+    yield result(one_a)
+
+
+class TestTrampolineCombinators(ParserTestCase):
+    def run_parser(self, parser, input):
+        return run_parser(trampoline(parser), input)
+    
+    def testplain(self):
+        self.assertMatch(one_a, 'ab', 'a', 'b')
+        self.assertNoMatch(one_a, 'b')
+    
+    def testresult(self):
+        self.assertMatch(a_then_b, 'ab', None, '')
+        self.assertMatch(returns_parser, 'a', one_a, 'a')
+    
+    def testchoice(self):
+        self.assertMatch(p(choice, one_a, one_b), 'ba', 'b', 'a')
+        self.assertNoMatch(p(choice, one_a, one_b), 'c')
+        self.assertNoMatch(p(choice, a_then_b, one_a), 'ac')
+        self.assertMatch(p(choice, tri(a_then_b), one_a), 'ac', 'a', 'c')
+        self.assertMatch(p(optional, tri(a_then_b), 'x'), 'ac', 'x', 'ac')
+    
+    def testmany(self):
+        self.assertMatch(p(many, one_a), 'aab', ['a', 'a'], 'b')
+        self.assertMatch(p(many, one_a), 'b', [], 'b')
+        self.assertMatch(p(many1, one_a), 'ab', ['a'], 'b')
+        self.assertNoMatch(p(many1, one_a), 'b')
+    
+    def testsequencing(self):
+        self.assertMatch(p(cue, one_a, one_b), 'abc', 'b', 'c')
+        self.assertMatch(p(follow, one_a, one_b), 'abc', 'a', 'c')
+        self.assertNoMatch(p(cue, one_a, one_b), 'ac')
+    
+    def testdescribed(self):
+        try:
+            self.run_parser(p(follow, part, one_a), 'b')
+        except NoMatch, e:
+            self.assertEquals(e.expecting, ['(', '['])
+        else:
+            self.fail()
+        try:
+            self.run_parser(part, '(b')
+        except NoMatch, e:
+            self.assertEquals(e.expecting, [')'])
+        else:
+            self.fail()
+    
+    def testnesting(self):
+        self.assertMatch(part, '([])()', ['paren', [['bracket', []]]], '()')
+        self.assertNoMatch(part, '([)]')
+    
+    def testdeepnesting(self):
+        depth = 20000
+        tree, rest = self.run_parser(part, '(' * depth + ')' * depth)
+        self.assertEquals(rest, [])
+        for i in range(depth):
+            self.assertEquals(tree[0], 'paren')
+            tree = tree[1] and tree[1][0]
+        self.assertEquals(tree, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+__all__ = [cls.__name__ for name, cls in locals().items()
+                        if isinstance(cls, type) 
+                        and name.startswith('Test')]